@@ -0,0 +1,93 @@
+"""
+XCom backend that keeps tabular payloads out of the Airflow metadata DB.
+
+Tasks return pandas DataFrames or pyarrow Tables as usual. This backend
+writes them to local disk as Arrow IPC files and stores only a short
+reference in the XCom table; the downstream task gets the data back as a
+pyarrow Table read through a memory map, so loading does not copy the
+column buffers. Every other value goes through the default XCom
+serialization.
+
+Enable it for the scheduler and workers with
+    AIRFLOW__CORE__XCOM_BACKEND=arrow_xcom.ArrowXComBackend
+with this directory on PYTHONPATH (it is already on sys.path for DAG parsing,
+but the backend is loaded before any DAG is). WNV_AIRFLOW_DATA_DIR sets
+where the payload files are written; it must be shared by all workers.
+"""
+import os
+
+import pandas as pd
+import pyarrow as pa
+from airflow.models.xcom import BaseXCom
+
+DATA_DIR = os.environ.get("WNV_AIRFLOW_DATA_DIR", "/tmp/wnv_airflow")
+
+# Marks an XCom value as a reference to an Arrow IPC file
+REFERENCE_PREFIX = "arrow-xcom://"
+
+
+def _payload_path(dag_id, run_id, task_id, map_index, key):
+    safe_run_id = "".join(c if c.isalnum() or c in "-_." else "_" for c in str(run_id))
+    directory = os.path.join(DATA_DIR, "xcom", str(dag_id), safe_run_id)
+    os.makedirs(directory, exist_ok=True)
+    suffix = "" if map_index is None or map_index < 0 else f"_{map_index}"
+    return os.path.join(directory, f"{task_id}{suffix}_{key}.arrow")
+
+
+def write_table(table, path):
+    """
+    Write a pyarrow Table to path as an Arrow IPC file, replacing it atomically.
+    """
+    tmp_path = f"{path}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def read_table(path):
+    """
+    Memory-map an Arrow IPC file and return it as a pyarrow Table without copying the buffers.
+    """
+    with pa.memory_map(path, "r") as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+class ArrowXComBackend(BaseXCom):
+    """
+    Stores DataFrame, Table and RecordBatch XComs as Arrow IPC files and passes references.
+    """
+
+    @staticmethod
+    def serialize_value(value, *, key=None, task_id=None, dag_id=None, run_id=None, map_index=None, **kwargs):
+        if isinstance(value, pd.DataFrame):
+            value = pa.Table.from_pandas(value, preserve_index=False)
+        elif isinstance(value, pa.RecordBatch):
+            value = pa.Table.from_batches([value])
+        if isinstance(value, pa.Table):
+            path = _payload_path(dag_id, run_id, task_id, map_index, key)
+            write_table(value, path)
+            value = REFERENCE_PREFIX + path
+        return BaseXCom.serialize_value(
+            value, key=key, task_id=task_id, dag_id=dag_id, run_id=run_id, map_index=map_index, **kwargs
+        )
+
+    @staticmethod
+    def deserialize_value(result):
+        value = BaseXCom.deserialize_value(result)
+        if isinstance(value, str) and value.startswith(REFERENCE_PREFIX):
+            return read_table(value[len(REFERENCE_PREFIX):])
+        return value
+
+    def orm_deserialize_value(self):
+        # The UI shows the reference instead of loading the payload
+        return BaseXCom.deserialize_value(self)
+
+    @classmethod
+    def purge(cls, xcom, session=None):
+        # Remove the payload file when Airflow clears the XCom
+        value = BaseXCom.deserialize_value(xcom)
+        if isinstance(value, str) and value.startswith(REFERENCE_PREFIX):
+            path = value[len(REFERENCE_PREFIX):]
+            if os.path.exists(path):
+                os.remove(path)
@@ -1,8 +1,18 @@
 from airflow import DAG
 from datetime import datetime
 from airflow.operators.python import PythonOperator
-import pandas as pd
-import requests
+
+from http_extract import HttpExtractOperator
+from http_sensor import SourceChangedSensor, commit_validators
+from time_transform import transform_responses
+
+# FastAPI endpoints pulled on every run; add feeds here and they are fetched concurrently
+ENDPOINTS = [
+    "http://127.0.0.1:8000/time/",
+]
+
+# Airflow Variable holding the ETag/Last-Modified/body hash of the last loaded response per endpoint
+VALIDATORS_KEY = "current_time_validators"
 
 # Define the DAG for extracting, transforming, and loading current time data
 with DAG(
@@ -10,76 +20,72 @@ with DAG(
     start_date=datetime(year=2024, month=12, day=21, hour=9, minute=0),  # DAG start date and time
     schedule="@hourly",  # Schedule to run every hour
     catchup=False,  # Do not backfill missing runs
-    max_active_runs=1,  # Allow only one active DAG run at a time
-    render_template_as_native_obj=True  # Enable native object rendering in templates
+    max_active_runs=1  # Allow only one active DAG run at a time
 ) as dag:
 
-    # Define the function to extract data from the API
-    def extract_data_callable():
-        """
-        Extract the current time from a local API endpoint.
-        """
-        print("Extracting current time from API")  # Log a message
-        url = "http://127.0.0.1:8000/time/"  # API endpoint
-
-        # Make a GET request to the API and parse the response
-        date_obj = requests.get(url).json()
-
-        # Create a dictionary to store the extracted date
-        date_dic = {"date": date_obj}
+    # Tasks hand each other Arrow tables; the Arrow XCom backend (arrow_xcom.py) keeps them on
+    # local disk and stores only a reference in the metadata DB
 
-        return date_dic  # Return the extracted data
+    # Wait on the triggerer, without holding a worker slot, until an endpoint has new data;
+    # if nothing changes before the next scheduled run, this run is skipped
+    wait_for_change = SourceChangedSensor(
+        dag=dag,
+        task_id="wait_for_change",  # Task identifier
+        endpoints=ENDPOINTS,  # API endpoints
+        variable_key=VALIDATORS_KEY,  # Validators of the last loaded responses
+        poll_interval=60,  # Seconds between conditional requests
+        timeout=55 * 60,  # Give up shortly before the next hourly run
+        soft_fail=True,  # Skip the run instead of failing it when nothing changed
+    )
 
-    # Define the PythonOperator for extracting data
-    extract_data = PythonOperator(
+    # Extract the current time from the API endpoints with a pooled, retrying HTTP client
+    extract_data = HttpExtractOperator(
         dag=dag,
         task_id="extract_time",  # Task identifier
-        python_callable=extract_data_callable  # Function to execute
+        endpoints=ENDPOINTS,  # API endpoints
+        timeout=10.0,  # Seconds per request
+        http_retries=3,  # Retries with exponential backoff on connection errors, 429 and 5xx
     )
 
     # Define the function to transform the extracted data
     def transform_data_callable(raw_data):
         """
-        Transform the extracted data into a list format.
+        Parse the extracted responses into a "date" column (see time_transform.py).
         """
-        transformed_data = [
-            [
-                raw_data.get("date"),  # Extract the "date" field
-            ]
-        ]
-        return transformed_data  # Return the transformed data
+        return transform_responses(raw_data)
 
     # Define the PythonOperator for transforming data
     transform_data = PythonOperator(
         dag=dag,
         task_id="transform_data",  # Task identifier
         python_callable=transform_data_callable,  # Function to execute
-        op_kwargs={"raw_data": "{{ ti.xcom_pull(task_ids='extract_time') }}"}  # Pass data from the previous task
+        op_kwargs={"raw_data": extract_data.output}  # Table returned by the previous task
     )
 
     # Define the function to load the transformed data
-    def load_data_callable(transformed_data):
+    def load_data_callable(transformed_data, validators):
         """
-        Load the transformed data into a pandas DataFrame and print it.
+        Load the transformed data into a pandas DataFrame and print it, then mark the source data as processed.
         """
-        # Create a DataFrame from the transformed data
-        loaded_data = pd.DataFrame(transformed_data)
+        # Convert the memory-mapped Arrow table to a DataFrame
+        loaded_data = transformed_data.to_pandas()
 
-        # Set column names for the DataFrame
-        loaded_data.columns = [
-            "date"
-        ]
-        
         # Print the DataFrame
         print(loaded_data)
 
+        # Only a successful load advances the validators, so a failed run is retried on the next change
+        commit_validators(VALIDATORS_KEY, validators)
+
     # Define the PythonOperator for loading data
     load_data = PythonOperator(
         dag=dag,
         task_id="load_data",  # Task identifier
         python_callable=load_data_callable,  # Function to execute
-        op_kwargs={"transformed_data": "{{ ti.xcom_pull(task_ids='transform_data') }}"}  # Pass data from the previous task
+        op_kwargs={
+            "transformed_data": transform_data.output,  # Table returned by the previous task
+            "validators": wait_for_change.output,  # Validators of the responses that triggered this run
+        }
     )
 
     # Set dependencies between tasks
-    extract_data >> transform_data >> load_data  # Define the task sequence
\ No newline at end of file
+    wait_for_change >> extract_data >> transform_data >> load_data  # Define the task sequence
\ No newline at end of file
@@ -0,0 +1,168 @@
+"""
+Deferrable change sensor for the FastAPI feeds.
+
+SourceChangedSensor hands its wait to the triggerer, so it holds no worker
+slot while polling. The trigger polls every endpoint on one
+httpx.AsyncClient with conditional requests (If-None-Match for the last
+ETag, If-Modified-Since for the last Last-Modified): a 304 means unchanged.
+Endpoints that send neither header, or ignore them, are compared by the
+SHA-256 of the response body instead. The trigger fires as soon as any
+endpoint has changed, so the rest of the DAG only runs on new data.
+
+The validators of the last processed response are kept per URL in an
+Airflow Variable. The sensor only passes the new ones on through XCom;
+commit_validators stores them once the downstream load has succeeded, so a
+failed run is picked up again by the next one.
+
+The triggerer imports the trigger by its classpath, so this directory must
+be on its PYTHONPATH as well.
+"""
+import asyncio
+import hashlib
+import time
+from datetime import timedelta
+
+import httpx
+from airflow.exceptions import AirflowSensorTimeout, AirflowSkipException
+from airflow.models import Variable
+from airflow.sensors.base import BaseSensorOperator
+from airflow.triggers.base import BaseTrigger, TriggerEvent
+
+
+def load_validators(variable_key):
+    """
+    Validators of the last processed response per URL, as stored by commit_validators.
+    """
+    return Variable.get(variable_key, default_var={}, deserialize_json=True)
+
+
+def commit_validators(variable_key, validators):
+    """
+    Merge the validators of the processed responses into the Airflow Variable.
+    """
+    stored = load_validators(variable_key)
+    stored.update(validators or {})
+    Variable.set(variable_key, stored, serialize_json=True)
+
+
+def _conditional_headers(validators):
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    return headers
+
+
+async def _check(client, url, previous):
+    """
+    Return the new validators of url if it changed since previous, else None.
+    """
+    response = await client.get(url, headers=_conditional_headers(previous))
+    if response.status_code == 304:
+        return None
+    response.raise_for_status()
+    validators = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "sha256": hashlib.sha256(response.content).hexdigest(),
+    }
+    # Servers that ignore the conditional headers still answer 200, so fall back to the body hash
+    if validators["etag"] and validators["etag"] == previous.get("etag"):
+        return None
+    if validators["sha256"] == previous.get("sha256"):
+        return None
+    return validators
+
+
+class SourceChangedTrigger(BaseTrigger):
+    """
+    Poll endpoints until at least one has changed or timeout seconds have passed.
+
+    Emits {"status": "changed", "validators": {url: validators}} for the
+    changed endpoints, or {"status": "timeout"}.
+    """
+
+    def __init__(self, endpoints, validators, poll_interval=60.0, timeout=3300.0, request_timeout=10.0):
+        super().__init__()
+        self.endpoints = endpoints
+        self.validators = validators
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.request_timeout = request_timeout
+
+    def serialize(self):
+        return (
+            "http_sensor.SourceChangedTrigger",
+            {
+                "endpoints": self.endpoints,
+                "validators": self.validators,
+                "poll_interval": self.poll_interval,
+                "timeout": self.timeout,
+                "request_timeout": self.request_timeout,
+            },
+        )
+
+    async def run(self):
+        deadline = time.monotonic() + self.timeout
+        async with httpx.AsyncClient(timeout=httpx.Timeout(self.request_timeout)) as client:
+            while True:
+                results = await asyncio.gather(
+                    *(_check(client, url, self.validators.get(url, {})) for url in self.endpoints),
+                    return_exceptions=True,
+                )
+                changed = {}
+                for url, result in zip(self.endpoints, results):
+                    if isinstance(result, Exception):
+                        # A failed poll counts as unchanged; the next one tries again
+                        self.log.warning("Polling %s failed: %s", url, result)
+                    elif result is not None:
+                        changed[url] = result
+                if changed:
+                    yield TriggerEvent({"status": "changed", "validators": changed})
+                    return
+                if time.monotonic() + self.poll_interval > deadline:
+                    yield TriggerEvent({"status": "timeout"})
+                    return
+                await asyncio.sleep(self.poll_interval)
+
+
+class SourceChangedSensor(BaseSensorOperator):
+    """
+    Wait, deferred to the triggerer, until one of the endpoints has changed since the last committed run.
+
+    Returns the new validators per URL; pass them to commit_validators after
+    the load. With soft_fail, a run in which nothing changed before the
+    timeout is skipped instead of failed.
+    """
+
+    template_fields = ("endpoints",)
+
+    def __init__(self, endpoints, variable_key, poll_interval=60.0, request_timeout=10.0, **kwargs):
+        super().__init__(**kwargs)
+        self.endpoints = endpoints
+        self.variable_key = variable_key
+        self.poll_interval = poll_interval
+        self.request_timeout = request_timeout
+
+    def execute(self, context):
+        self.defer(
+            trigger=SourceChangedTrigger(
+                endpoints=self.endpoints,
+                validators=load_validators(self.variable_key),
+                poll_interval=self.poll_interval,
+                timeout=self.timeout,
+                request_timeout=self.request_timeout,
+            ),
+            method_name="execute_complete",
+            timeout=timedelta(seconds=self.timeout + self.poll_interval + self.request_timeout),
+        )
+
+    def execute_complete(self, context, event=None):
+        if event["status"] != "changed":
+            message = f"No change at {self.endpoints} within {self.timeout} seconds"
+            if self.soft_fail:
+                raise AirflowSkipException(message)
+            raise AirflowSensorTimeout(message)
+        self.log.info("Changed: %s", ", ".join(event["validators"]))
+        return event["validators"]
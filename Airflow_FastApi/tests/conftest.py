@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The DAG helper modules live one directory up, where Airflow puts them on sys.path for DAG parsing
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
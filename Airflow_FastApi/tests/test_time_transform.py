@@ -0,0 +1,50 @@
+import json
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pytest
+
+from time_transform import extract_date, transform_responses
+
+
+def _responses(bodies):
+    """
+    Table shaped like HttpExtractOperator's output, with one record batch per response.
+    """
+    fetched_at = datetime(2024, 12, 21, 9, 0, 5, tzinfo=timezone.utc)
+    batches = [
+        pa.RecordBatch.from_pylist([{
+            "url": "http://127.0.0.1:8000/time/",
+            "params": "{}",
+            "status_code": 200,
+            "fetched_at": fetched_at,
+            "body": body,
+        }])
+        for body in bodies
+    ]
+    return pa.Table.from_batches(batches)
+
+
+def test_transform_reads_every_response_shape():
+    bodies = [
+        # FastAPI's encoding of a returned datetime
+        json.dumps("2024-12-21T09:00:04.512345"),
+        # A JSON object carrying the time with other fields
+        json.dumps({"date": "2024-12-21T09:00:04+00:00", "timezone": "UTC", "source": "fastapi"}),
+        # Unix seconds
+        json.dumps(1734771604),
+    ]
+    table = transform_responses(_responses(bodies))
+
+    assert table.schema == pa.schema([("date", pa.string())])
+    assert table.column("date").to_pylist() == [
+        "2024-12-21T09:00:04.512345",
+        "2024-12-21T09:00:04+00:00",
+        "2024-12-21T09:00:04+00:00",
+    ]
+
+
+@pytest.mark.parametrize("body", [json.dumps({"time": "2024-12-21T09:00:04"}), "null", "true", "[1, 2]"])
+def test_extract_date_rejects_responses_without_a_date(body):
+    with pytest.raises(ValueError):
+        extract_date(body)
@@ -0,0 +1,48 @@
+"""
+Transform step of the current_time DAG, kept free of Airflow imports so it can be tested on its own.
+
+The /time/ endpoint may answer with a bare JSON string ("2024-12-21T09:00:00"),
+an object holding the time in a "date" field ({"date": "2024-12-21T09:00:00"}),
+or a Unix timestamp in seconds. extract_date reads each of these into an ISO
+8601 string, so a change in the response shape fails loudly instead of being
+cast to text.
+"""
+import json
+from datetime import datetime, timezone
+
+import pyarrow as pa
+
+# Field of an object response that holds the time
+DATE_FIELD = "date"
+
+SCHEMA = pa.schema([("date", pa.string())])
+
+
+def extract_date(body):
+    """
+    ISO 8601 date of one response body: a JSON string, an object with a "date" field, or Unix seconds.
+    """
+    payload = json.loads(body)
+    if isinstance(payload, dict):
+        if DATE_FIELD not in payload:
+            raise ValueError(f"Response has no {DATE_FIELD!r} field, only {sorted(payload)}: {body[:200]}")
+        payload = payload[DATE_FIELD]
+    if isinstance(payload, str):
+        return payload
+    if isinstance(payload, (int, float)) and not isinstance(payload, bool):
+        return datetime.fromtimestamp(payload, tz=timezone.utc).isoformat()
+    raise ValueError(f"Response does not hold a date: {body[:200]}")
+
+
+def transform_responses(raw_data):
+    """
+    Parse the extracted responses into a "date" column, one record batch at a time.
+    """
+    batches = [
+        pa.record_batch(
+            [pa.array([extract_date(body) for body in batch.column("body").to_pylist()], pa.string())],
+            schema=SCHEMA,
+        )
+        for batch in raw_data.to_batches()
+    ]
+    return pa.Table.from_batches(batches, schema=SCHEMA)
@@ -1,107 +1,46 @@
-from sklearn.svm import SVR
-from sklearn import metrics
-import pandas as pd
-from matplotlib import pyplot as plt
-import numpy as np
-from sklearn.preprocessing import StandardScaler
-
-
-# Load the dataset into a Pandas DataFrame
-data = pd.read_csv("/Users/ericliao/Desktop/WNV_project_files/WNV/california/CA_13_county_dataset/CA_13_counties_04_23_no_impute.csv",
-                   index_col=False,
-                   header=0)
-
-# Drop columns that are not features and drop target
-data = data.drop([
-    "Date",
-    "County",
-    "Latitude",
-    "Longitude",
-    "Total_Bird_WNV_Count",
-    "Mos_WNV_Count",
-    "Horse_WNV_Count",
-    # "lai_hv_1m_shift"
-], axis=1)
-
-# Drop columns if all the values in the columns are the same or all nan
-data = data.dropna(axis=1, how='all')
-
-# Reindex the data
-data = data.reset_index(drop=True)
-
-# Print 0 variance columns
-print(data.columns[data.var() == 0])
-
-# Check if any columns have zero variance and drop the columns
-data = data.loc[:, data.var() != 0]
-
-# Get the unique years and sort them
-years = data["Year"].unique()
-years.sort()
-
-## impute any missing in Human_Disease_Count with 0
-data["Human_Disease_Count"] = data["Human_Disease_Count"].fillna(0)
-
-## get the training and testing data
-train = data[data['Year'] < 2019].copy()
-# test = data[(data['Year'] >= 2019)].copy()
-
-## get test data only for year in 2019 and 2023
-test = data[data['Year'].isin([2019])]
-
-## bootstraping training data for 1000 iterations
-n_iterations = 1000
-n_size = int(len(train))
-train_samples = []
-
-for i in range(n_iterations):
-    sample = train.sample(n=n_size, replace=True)
-    train_samples.append(sample)
-
-## boostraping to train the svm model and predict the testing data, get the q2 and mse
-q2_list = []
-rmse_list = []
-
-for i in range(n_iterations):
-    print(f"iteration: {i}")
-    x_train = train_samples[i]
-    x_test = test.copy()
+import os
 
-    # Get labels
-    y_train = x_train.pop("Human_Disease_Count").values
-    y_test = x_test.pop("Human_Disease_Count").values
-
-    ## Remove unnecessary columns
-    x_train.drop(["Month", "FIPS", "Year"], axis=1, inplace=True)
-    x_test.drop(["Month", "FIPS", "Year"], axis=1, inplace=True)
-
-    # Scale the data
-    scaler = StandardScaler()
-    x_train = scaler.fit_transform(x_train)
-    x_test = scaler.transform(x_test)
-
-    # # Train the model with svm using 2018 tuned hyperparameters
-    # model = SVR(C=8.967266674728009, epsilon=0.10424919467608322, gamma='auto', kernel='rbf')
-
-    # Train the model with svm using 2009 tuned hyperparameters
-    model = SVR(C=0.660013053582507, epsilon=0.188805559508538, gamma='auto', kernel='poly')
-
-    model.fit(x_train, y_train)
-
-    # Predict the test data
-    predictions = model.predict(x_test)
-
-    # Calculate the q2 and rmse
-    q2 = metrics.r2_score(y_test, predictions)
-    mse = metrics.mean_squared_error(y_test, predictions)
-    rmse = np.sqrt(mse)
+import matplotlib
+import numpy as np
 
-    q2_list.append(q2)
-    rmse_list.append(rmse)
+from wnv_bootstrap import run_bootstrap
+from wnv_design import build_design_matrix, drop_uninformative_columns
+from wnv_io import read_features
+from wnv_models import regressor_from_env
+from wnv_profiling import profiled_main
+
+# Set WNV_SHOW_PLOTS=1 to also open the figures in a window; by default they are only saved,
+# with the non-interactive Agg backend, so the script can run in a scheduled job
+SHOW_PLOTS = os.environ.get("WNV_SHOW_PLOTS", "0") == "1"
+if not SHOW_PLOTS:
+    matplotlib.use("Agg")
+
+from matplotlib import pyplot as plt  # noqa: E402
+
+# California 13-county dataset directory, overridable with WNV_CA_DATASET_DIR; the plots go to its result folder
+CA_DATASET_DIR = os.environ.get(
+    "WNV_CA_DATASET_DIR", "/Users/ericliao/Desktop/WNV_project_files/WNV/california/CA_13_county_dataset"
+)
+DATA_PATH = os.path.join(CA_DATASET_DIR, "CA_13_counties_04_23_no_impute.csv")
+PLOT_DIR = os.path.join(
+    CA_DATASET_DIR, "result", "plots", "train_before_2019_01_01_predict_after_2019_01_01",
+    "using_2009_model_best_hyperparameter",
+)
+
+# Bootstrap settings, overridable from the environment
+N_ITERATIONS = int(os.environ.get("WNV_BOOTSTRAP_ITERATIONS", 1000))
+N_WORKERS = int(os.environ.get("WNV_N_WORKERS", os.cpu_count()))
+RANDOM_SEED = int(os.environ.get("WNV_BOOTSTRAP_SEED", 0))
+# Regressor backend, approximate kernel features and kernel mode: "exact" scales each replicate
+# on its own resample, "precomputed" scales once and gathers every replicate from one shared kernel matrix
+SVR_BACKEND, SVR_COMPONENTS, KERNEL_MODE = regressor_from_env()
+
+# # 2018 tuned hyperparameters
+# MODEL_PARAMS = dict(C=8.967266674728009, epsilon=0.10424919467608322, gamma='auto', kernel='rbf')
+
+# 2009 tuned hyperparameters
+MODEL_PARAMS = dict(C=0.660013053582507, epsilon=0.188805559508538, gamma='auto', kernel='poly')
 
-## calculate confidence interval for q2 and rmse
-q2_mean = round(np.mean(q2_list), 2)
-rmse_mean = round(np.mean(rmse_list), 2)
 
 ## define the confidence interval
 def confidence_interval(data, alpha=0.05):
@@ -109,35 +48,111 @@ def confidence_interval(data, alpha=0.05):
     upper_bound = np.percentile(data, 100 * (1 - alpha / 2), axis=0)
     return round(lower_bound, 2), round(upper_bound, 2)
 
-q2_lower, q2_upper = confidence_interval(q2_list)
-
-mse_lower, mse_upper = confidence_interval(rmse_list)
-
-## plot the q2 and mse separately with confidence interval
-plt.figure(figsize=(10, 5))
-plt.hist(q2_list, bins=30, color='blue', alpha=0.5)
-plt.axvline(q2_mean, color='red', linestyle='dashed', linewidth=2, label=f'mean Q2: {q2_mean}')
-plt.axvline(q2_lower, color='purple', linestyle='dashed', linewidth=2, label=f'95% confidence interval lower bound: {q2_lower}')
-plt.axvline(q2_upper, color='black', linestyle='dashed', linewidth=2, label=f'95% confidence interval upper bound: {q2_upper}')
-
-## add legend
-plt.legend(loc='upper left')
-
-plt.title("Q2 distribution")
-plt.savefig("/Users/ericliao/Desktop/WNV_project_files/WNV/california/CA_13_county_dataset/result/plots/train_before_2019_01_01_predict_after_2019_01_01/using_2009_model_best_hyperparameter/bootstrapping_svm_q2_distribution_remove_20_21_22_23.png")
-plt.show()
-
-plt.figure(figsize=(10, 5))
-plt.hist(rmse_list, bins=30, color='blue', alpha=0.5)
-plt.axvline(np.mean(rmse_list), color='red', linestyle='dashed', linewidth=2, label=f'mean RMSE: {rmse_mean}')
-plt.axvline(mse_lower, color='purple', linestyle='dashed', linewidth=2, label=f'95% confidence interval lower bound: {mse_lower}')
-plt.axvline(mse_upper, color='black', linestyle='dashed', linewidth=2, label=f'95% confidence interval upper bound: {mse_upper}')
-
-## add legend
-plt.legend(loc='upper right')
-
-plt.title("RMSE distribution")
-plt.savefig("/Users/ericliao/Desktop/WNV_project_files/WNV/california/CA_13_county_dataset/result/plots/train_before_2019_01_01_predict_after_2019_01_01/using_2009_model_best_hyperparameter/bootstrapping_svm_rmse_distribution_remove_20_21_22_23.png")
-plt.show()
-
 
+@profiled_main("2_bootstrap_svm_prediction")
+def main(recorder):
+
+    # Load the feature columns of every year; columns that are not features are never read
+    # when the Parquet copy of the dataset exists
+    with recorder.stage("csv_load") as stage:
+        data = read_features(DATA_PATH,
+                             exclude=[
+                                 "Date",
+                                 "County",
+                                 "Latitude",
+                                 "Longitude",
+                                 "Total_Bird_WNV_Count",
+                                 "Mos_WNV_Count",
+                                 "Horse_WNV_Count",
+                                 # "lai_hv_1m_shift"
+                             ])
+        stage["rows"] = len(data)
+
+    # Print 0 variance columns
+    print(data.columns[data.var() == 0])
+
+    # Drop columns if all the values in the columns are the same or all nan, over every year,
+    # then keep the years up to the test year
+    data = drop_uninformative_columns(data)
+    data = data[data["Year"] <= 2019].reset_index(drop=True)
+
+    ## impute any missing in Human_Disease_Count with 0
+    data["Human_Disease_Count"] = data["Human_Disease_Count"].fillna(0)
+
+    ## get the training and testing data
+    train = data[data['Year'] < 2019].reset_index(drop=True)
+    # test = data[(data['Year'] >= 2019)].copy()
+
+    ## get test data only for year in 2019 and 2023
+    test = data[data['Year'].isin([2019])].reset_index(drop=True)
+
+    ## build the feature matrices once; each bootstrap replicate is scaled from these arrays
+    X_train, y_train, _ = build_design_matrix(train, "Human_Disease_Count", ["Month", "FIPS", "Year"])
+    X_test, y_test, _ = build_design_matrix(test, "Human_Disease_Count", ["Month", "FIPS", "Year"])
+
+    ## bootstrap the training data: resamples are drawn lazily as indices inside the
+    ## workers, and the per-iteration q2 and rmse are streamed back as fits finish
+    q2_list = np.empty(N_ITERATIONS)
+    rmse_list = np.empty(N_ITERATIONS)
+
+    fit_seconds = np.empty(N_ITERATIONS)
+    predict_seconds = np.empty(N_ITERATIONS)
+
+    with recorder.stage("bootstrap", rows=N_ITERATIONS):
+        results = run_bootstrap(X_train, y_train, X_test, y_test, MODEL_PARAMS, n_iterations=N_ITERATIONS, n_workers=N_WORKERS, seed=RANDOM_SEED,
+                                kernel_mode=KERNEL_MODE, backend=SVR_BACKEND, n_components=SVR_COMPONENTS, timings=True)
+        for n_done, (i, q2, rmse, fit_time, predict_time) in enumerate(results, start=1):
+            print(f"iteration: {n_done}/{N_ITERATIONS}")
+            q2_list[i] = q2
+            rmse_list[i] = rmse
+            fit_seconds[i] = fit_time
+            predict_seconds[i] = predict_time
+
+    ## per-iteration fit and predict times, measured inside the workers
+    for name, seconds in (("bootstrap_fit", fit_seconds), ("bootstrap_predict", predict_seconds)):
+        recorder.add(name, rows=N_ITERATIONS, total_seconds=seconds.sum(), mean_seconds=seconds.mean(), max_seconds=seconds.max())
+
+    ## calculate confidence interval for q2 and rmse
+    q2_mean = round(np.mean(q2_list), 2)
+    rmse_mean = round(np.mean(rmse_list), 2)
+
+    q2_lower, q2_upper = confidence_interval(q2_list)
+
+    mse_lower, mse_upper = confidence_interval(rmse_list)
+
+    ## plot the q2 and mse separately with confidence interval
+    plt.figure(figsize=(10, 5))
+    plt.hist(q2_list, bins=30, color='blue', alpha=0.5)
+    plt.axvline(q2_mean, color='red', linestyle='dashed', linewidth=2, label=f'mean Q2: {q2_mean}')
+    plt.axvline(q2_lower, color='purple', linestyle='dashed', linewidth=2, label=f'95% confidence interval lower bound: {q2_lower}')
+    plt.axvline(q2_upper, color='black', linestyle='dashed', linewidth=2, label=f'95% confidence interval upper bound: {q2_upper}')
+
+    ## add legend
+    plt.legend(loc='upper left')
+
+    plt.title("Q2 distribution")
+    ## the figure is rendered when it is saved
+    with recorder.stage("plot_q2"):
+        plt.savefig(os.path.join(PLOT_DIR, "bootstrapping_svm_q2_distribution_remove_20_21_22_23.png"))
+    if SHOW_PLOTS:
+        plt.show()
+
+    plt.figure(figsize=(10, 5))
+    plt.hist(rmse_list, bins=30, color='blue', alpha=0.5)
+    plt.axvline(np.mean(rmse_list), color='red', linestyle='dashed', linewidth=2, label=f'mean RMSE: {rmse_mean}')
+    plt.axvline(mse_lower, color='purple', linestyle='dashed', linewidth=2, label=f'95% confidence interval lower bound: {mse_lower}')
+    plt.axvline(mse_upper, color='black', linestyle='dashed', linewidth=2, label=f'95% confidence interval upper bound: {mse_upper}')
+
+    ## add legend
+    plt.legend(loc='upper right')
+
+    plt.title("RMSE distribution")
+    ## the figure is rendered when it is saved
+    with recorder.stage("plot_rmse"):
+        plt.savefig(os.path.join(PLOT_DIR, "bootstrapping_svm_rmse_distribution_remove_20_21_22_23.png"))
+    if SHOW_PLOTS:
+        plt.show()
+
+
+if __name__ == "__main__":
+    main()
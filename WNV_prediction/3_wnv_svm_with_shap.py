@@ -1,14 +1,20 @@
 import os
-from sklearn.svm import SVR
 from sklearn import metrics
 import pandas as pd
 import shap
 from matplotlib import pyplot as plt
 import numpy as np
+import joblib
 from sklearn.preprocessing import StandardScaler
 
+from wnv_design import drop_uninformative_columns
+from wnv_io import parquet_path, read_features, write_partitioned
+from wnv_models import compare_backends, config_key, evaluate_configs, regressor_from_env, svr_params
+from wnv_profiling import profiled_main
+from wnv_shap import explain, global_importance, render_local_plots, write_local_table
+
 # Set the base directory for relative paths
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.environ.get("WNV_BASE_DIR", os.path.dirname(os.path.abspath(__file__)))
 
 # Define file paths
 DATA_PATH = os.path.join(BASE_DIR, "data", "CA_13_county_dataset", "CA_13_counties_04_23_no_impute_daylight.csv")
@@ -16,108 +22,212 @@ HYPERPARAMS_PATH = os.path.join(BASE_DIR, "results", "SVM", "hyperparameter_tuni
 RESULTS_DIR = os.path.join(BASE_DIR, "results", "SVM")
 PREDICTION_RESULTS_PATH = os.path.join(RESULTS_DIR, "svm_predictions.csv")
 TUNING_RESULTS_PATH = os.path.join(RESULTS_DIR, "svm_tuning_results.csv")
+BACKEND_COMPARISON_PATH = os.path.join(RESULTS_DIR, "svm_backend_comparison.csv")
 GLOBAL_SHAP_PLOT_PATH = os.path.join(RESULTS_DIR, "shap_plots", "svm_global_shap_plot.png")
+GLOBAL_SHAP_IMPORTANCE_PATH = os.path.join(RESULTS_DIR, "shap_plots", "svm_global_shap_importance.csv")
 LOCAL_SHAP_PLOTS_DIR = os.path.join(RESULTS_DIR, "shap_plots", "individual")
-
-# Ensure directories exist
-os.makedirs(RESULTS_DIR, exist_ok=True)
-os.makedirs(os.path.dirname(GLOBAL_SHAP_PLOT_PATH), exist_ok=True)
-os.makedirs(LOCAL_SHAP_PLOTS_DIR, exist_ok=True)
-
-# Load the dataset
-data = pd.read_csv(DATA_PATH, index_col=False)
-
-# Drop unnecessary columns and target columns
-data.drop(columns=["Date", "County", "Latitude", "Longitude", "Total_Bird_WNV_Count", "Mos_WNV_Count", "Horse_WNV_Count"], inplace=True, errors='ignore')
-
-# Drop columns with all NaN or zero variance
-data.dropna(axis=1, how='all', inplace=True)
-zero_variance_cols = data.columns[data.var() == 0]
-print(f"Columns with zero variance: {zero_variance_cols.tolist()}")
-data = data.loc[:, data.var() != 0]
-
-# Impute missing values in the target column
-data["Human_Disease_Count"].fillna(0, inplace=True)
-
-# Split data into training and testing sets
-train = data[data['Year'] < 2019].dropna().reset_index(drop=True)
-test = data[data['Year'] >= 2019].dropna().reset_index(drop=True)
-
-# Separate labels and features
-train_labels = train.pop("Human_Disease_Count").values
-test_labels = test.pop("Human_Disease_Count").values
-
-# Drop non-feature columns
-test_FIPS_list = test.pop("FIPS").values
-test_month_list = test.pop("Month").values
-test_year_list = test.pop("Year").values
-train.drop(columns=["Month", "FIPS", "Year"], inplace=True)
-
-# Scale data
-scaler = StandardScaler()
-train = pd.DataFrame(scaler.fit_transform(train), columns=train.columns)
-test = pd.DataFrame(scaler.transform(test), columns=test.columns)
-
-# Load hyperparameters
-best_hyperparameters = pd.read_csv(HYPERPARAMS_PATH)
-
-# Initialize results storage
-tuning_year_q2_rmse_list = []
-
-for index, row in best_hyperparameters.iterrows():
-    tuning_year = row['tuning_year']
-    model = SVR(
-        C=float(row['C']),
-        epsilon=float(row['epsilon']),
-        gamma=row['gamma'],
-        kernel=row['kernel']
-    )
-
-    # Train the model and predict
-    model.fit(train, train_labels)
-    predictions = model.predict(test)
-
-    # Save predictions
-    prediction_results = pd.DataFrame({
-        "FIPS": test_FIPS_list,
-        "Month": test_month_list,
-        "Year": test_year_list,
-        "Human_Disease_Count": test_labels,
-        "Predicted_Human_Disease_Count": predictions
-    })
+LOCAL_SHAP_TABLE_PATH = os.path.join(RESULTS_DIR, "shap_plots", "svm_local_shap_values")
+MODELS_DIR = os.path.join(RESULTS_DIR, "models")
+
+# Worker processes for model fitting and SHAP, and the model to explain (e.g. "svm_2009";
+# defaults to the last tuning year in the hyperparameter table)
+N_WORKERS = int(os.environ.get("WNV_N_WORKERS", os.cpu_count()))
+EXPLAIN_MODEL = os.environ.get("WNV_EXPLAIN_MODEL")
+
+# Set WNV_COMPARE_BACKENDS=1 to benchmark the approximate regressor backends against exact SVR
+COMPARE_BACKENDS = os.environ.get("WNV_COMPARE_BACKENDS", "0") == "1"
+
+# Save each tuning year's scaler and fitted model to MODELS_DIR/<model_name>.joblib for wnv_service.py;
+# set WNV_SAVE_MODELS=0 to keep only the explained model in memory
+SAVE_MODELS = os.environ.get("WNV_SAVE_MODELS", "1") == "1"
+
+# Regressor backend ("exact" SVR, "nystroem" or "rff" kernel approximation, or "linear"), number of
+# approximate kernel features, and kernel mode: "precomputed" fits the configs that share a kernel on one
+# cached kernel matrix, "exact" fits each on the features
+SVR_BACKEND, SVR_COMPONENTS, KERNEL_MODE = regressor_from_env(default_kernel_mode="precomputed")
+KERNEL_CACHE_BYTES = int(os.environ.get("WNV_KERNEL_CACHE_MB", 1024)) * 2**20
+
+# SHAP settings, overridable from the environment
+SHAP_BACKGROUND_SIZE = int(os.environ.get("WNV_SHAP_BACKGROUND_SIZE", 50))  # k-means centroids summarizing the background
+SHAP_EXPLAIN_ROWS = int(os.environ.get("WNV_SHAP_EXPLAIN_ROWS", 0))  # 0 explains every test row
+SHAP_NSAMPLES = os.environ.get("WNV_SHAP_NSAMPLES", "auto")
+SHAP_BATCH_SIZE = int(os.environ.get("WNV_SHAP_BATCH_SIZE", 10_000))
+
+# Local explanation output: "png" (one plot per row), "parquet" or "html" (one table), or "none"
+SHAP_LOCAL_OUTPUTS = ("png", "parquet", "html", "none")
+SHAP_LOCAL_OUTPUT = os.environ.get("WNV_SHAP_LOCAL_OUTPUT", "png")
+SHAP_PLOT_SIZE = tuple(float(size) for size in os.environ.get("WNV_SHAP_PLOT_SIZE", "12x6").split("x"))
+SHAP_PLOT_DPI = int(os.environ.get("WNV_SHAP_PLOT_DPI", 100))
+
+
+@profiled_main("3_wnv_svm_with_shap")
+def main(recorder):
+    # Checked up front, so a typo does not silently skip the local output after the fits
+    if SHAP_LOCAL_OUTPUT not in SHAP_LOCAL_OUTPUTS:
+        raise ValueError(f"Unknown WNV_SHAP_LOCAL_OUTPUT {SHAP_LOCAL_OUTPUT!r}, expected one of {list(SHAP_LOCAL_OUTPUTS)}")
+
+
+    # Ensure directories exist
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    os.makedirs(os.path.dirname(GLOBAL_SHAP_PLOT_PATH), exist_ok=True)
+    os.makedirs(LOCAL_SHAP_PLOTS_DIR, exist_ok=True)
+
+    # Load the dataset without the unnecessary columns and target columns
+    with recorder.stage("csv_load") as stage:
+        data = read_features(DATA_PATH, exclude=["Date", "County", "Latitude", "Longitude", "Total_Bird_WNV_Count", "Mos_WNV_Count", "Horse_WNV_Count"])
+        stage["rows"] = len(data)
+
+    # Drop columns with all NaN or zero variance
+    zero_variance_cols = data.columns[data.var() == 0]
+    print(f"Columns with zero variance: {zero_variance_cols.tolist()}")
+    data = drop_uninformative_columns(data)
+
+    # Impute missing values in the target column
+    data["Human_Disease_Count"] = data["Human_Disease_Count"].fillna(0)
+
+    # Split data into training and testing sets
+    train = data[data['Year'] < 2019].dropna().reset_index(drop=True)
+    test = data[data['Year'] >= 2019].dropna().reset_index(drop=True)
+
+    # Separate labels and features
+    train_labels = train.pop("Human_Disease_Count").values
+    test_labels = test.pop("Human_Disease_Count").values
+
+    # Drop non-feature columns
+    test_FIPS_list = test.pop("FIPS").values
+    test_month_list = test.pop("Month").values
+    test_year_list = test.pop("Year").values
+    train.drop(columns=["Month", "FIPS", "Year"], inplace=True)
+
+    # Scale data
+    feature_names = train.columns.tolist()
+    scaler = StandardScaler()
+    train = scaler.fit_transform(train)
+    test = scaler.transform(test)
+
+    # Load hyperparameters and name each model after its tuning year
+    best_hyperparameters = pd.read_csv(HYPERPARAMS_PATH)
+    best_hyperparameters["model_name"] = "svm_" + best_hyperparameters["tuning_year"].astype(int).astype(str)
+    config_keys = [config_key(row) for _, row in best_hyperparameters.iterrows()]
+
+    # Explain the model picked by name, by default the last tuning year's
+    explain_model_name = EXPLAIN_MODEL or best_hyperparameters["model_name"].iloc[-1]
+    if explain_model_name not in set(best_hyperparameters["model_name"]):
+        raise ValueError(f"Unknown model {explain_model_name!r}, expected one of {best_hyperparameters['model_name'].tolist()}")
+    explain_key = config_keys[best_hyperparameters["model_name"].tolist().index(explain_model_name)]
+
+    # Train each distinct hyperparameter set once, in parallel, and predict the test data
+    with recorder.stage("fit_predict", rows=len(set(config_keys))):
+        config_results = evaluate_configs(
+            config_keys, train, train_labels, test, keep=config_keys if SAVE_MODELS else [explain_key], n_workers=N_WORKERS,
+            kernel_mode=KERNEL_MODE, kernel_cache_bytes=KERNEL_CACHE_BYTES,
+            backend=SVR_BACKEND, n_components=SVR_COMPONENTS,
+        )
+    model = config_results[explain_key][1]
+
+    # Initialize results storage
+    tuning_year_q2_rmse_list = []
+    prediction_results_list = []
+
+    for (index, row), key in zip(best_hyperparameters.iterrows(), config_keys):
+        tuning_year = row['tuning_year']
+        predictions = config_results[key][0]
+
+        # Collect predictions
+        prediction_results_list.append(pd.DataFrame({
+            "tuning_year": tuning_year,
+            "FIPS": test_FIPS_list,
+            "Month": test_month_list,
+            "Year": test_year_list,
+            "Human_Disease_Count": test_labels,
+            "Predicted_Human_Disease_Count": predictions
+        }))
+
+        # Calculate metrics
+        q2 = metrics.r2_score(test_labels, predictions)
+        rmse = np.sqrt(metrics.mean_squared_error(test_labels, predictions))
+        tuning_year_q2_rmse_list.append([tuning_year, q2, rmse, row['C'], row['epsilon'], row['gamma'], row['kernel']])
+        print(f"Tuning Year: {tuning_year}, Q^2: {q2:.2f}, RMSE: {rmse:.2f}")
+
+    # Save the predictions of every model, as CSV and as a Parquet dataset partitioned by tuning year
+    prediction_results = pd.concat(prediction_results_list, ignore_index=True)
     prediction_results.to_csv(PREDICTION_RESULTS_PATH, index=False)
-
-    # Calculate metrics
-    q2 = metrics.r2_score(test_labels, predictions)
-    rmse = np.sqrt(metrics.mean_squared_error(test_labels, predictions))
-    tuning_year_q2_rmse_list.append([tuning_year, q2, rmse, row['C'], row['epsilon'], row['gamma'], row['kernel']])
-    print(f"Tuning Year: {tuning_year}, Q^2: {q2:.2f}, RMSE: {rmse:.2f}")
-
-# Save tuning results
-tuning_results_df = pd.DataFrame(
-    tuning_year_q2_rmse_list, columns=["tuning_year", "q2", "RMSE", "C", "epsilon", "gamma", "kernel"]
-)
-tuning_results_df.to_csv(TUNING_RESULTS_PATH, index=False)
-
-# Define SHAP explainer
-explainer = shap.Explainer(lambda X: model.predict(X), test)(test)
-
-# Plot global SHAP values
-plt.figure(figsize=(30, 10))
-shap.plots.bar(explainer, show=False, max_display=18)
-plt.tight_layout()
-plt.savefig(GLOBAL_SHAP_PLOT_PATH)
-plt.close()
-
-# Plot individual SHAP values
-for i in range(len(test)):
-    plt.figure(figsize=(60, 20))
-    plt.subplots_adjust(left=0.4, right=0.6, top=0.9, bottom=0.1)
-
-    shap.plots.bar(explainer[i], show=False, max_display=17)
-    sample_plot_path = os.path.join(
-        LOCAL_SHAP_PLOTS_DIR, f"svm_local_shap_plot_{test_year_list[i]}_{test_month_list[i]}_{test_FIPS_list[i]}.png"
+    write_partitioned(prediction_results, parquet_path(PREDICTION_RESULTS_PATH), ["tuning_year"])
+
+    # Persist every model with the scaler and feature order it expects, for serving
+    if SAVE_MODELS:
+        with recorder.stage("save_models", rows=len(best_hyperparameters)):
+            os.makedirs(MODELS_DIR, exist_ok=True)
+            for (index, row), key in zip(best_hyperparameters.iterrows(), config_keys):
+                joblib.dump({
+                    "model_name": row["model_name"],
+                    "tuning_year": int(row["tuning_year"]),
+                    "params": svr_params(key),
+                    "feature_names": feature_names,
+                    "scaler": scaler,
+                    "model": config_results[key][1],
+                }, os.path.join(MODELS_DIR, f"{row['model_name']}.joblib"))
+
+    # Save tuning results
+    tuning_results_df = pd.DataFrame(
+        tuning_year_q2_rmse_list, columns=["tuning_year", "q2", "RMSE", "C", "epsilon", "gamma", "kernel"]
     )
-    plt.tight_layout()
-    plt.savefig(sample_plot_path)
-    plt.close()
\ No newline at end of file
+    tuning_results_df.to_csv(TUNING_RESULTS_PATH, index=False)
+
+    # Compare the accuracy and speed of the approximate backends with exact SVR on the explained model's hyperparameters
+    if COMPARE_BACKENDS:
+        with recorder.stage("backend_comparison"):
+            comparison = compare_backends(train, train_labels, test, test_labels, svr_params(explain_key), n_components=SVR_COMPONENTS)
+        comparison.to_csv(BACKEND_COMPARISON_PATH, index=False)
+        print(f"Backend comparison for {explain_model_name}:")
+        print(comparison.to_string(index=False))
+
+    # Explain the chosen model's test predictions with a k-means summarized background, batched predictions
+    # and the rows spread across worker processes
+    nsamples = SHAP_NSAMPLES if SHAP_NSAMPLES == "auto" else int(SHAP_NSAMPLES)
+    with recorder.stage("shap") as stage:
+        explanation, explained_rows = explain(
+            model, test, feature_names,
+            background_size=SHAP_BACKGROUND_SIZE,
+            n_explain=SHAP_EXPLAIN_ROWS,
+            nsamples=nsamples,
+            batch_size=SHAP_BATCH_SIZE,
+            n_workers=N_WORKERS,
+        )
+        stage["rows"] = len(explained_rows)
+
+    # Report global importance with 95% bootstrap confidence intervals over the explained rows
+    importance = global_importance(explanation)
+    importance.to_csv(GLOBAL_SHAP_IMPORTANCE_PATH, index=False)
+    print(f"Global SHAP importance (mean |SHAP|, 95% CI over {len(explained_rows)} explained rows):")
+    print(importance.to_string(index=False))
+
+    # Plot global SHAP values
+    with recorder.stage("plot_global_shap"):
+        plt.figure(figsize=(30, 10))
+        shap.plots.bar(explanation, show=False, max_display=18)
+        plt.tight_layout()
+        plt.savefig(GLOBAL_SHAP_PLOT_PATH)
+        plt.close()
+
+    # Plot individual SHAP values, or write them all to one table
+    with recorder.stage(f"local_shap_{SHAP_LOCAL_OUTPUT}", rows=len(explained_rows)):
+        if SHAP_LOCAL_OUTPUT == "png":
+            sample_plot_paths = [
+                os.path.join(
+                    LOCAL_SHAP_PLOTS_DIR, f"svm_local_shap_plot_{test_year_list[row]}_{test_month_list[row]}_{test_FIPS_list[row]}.png"
+                )
+                for row in explained_rows
+            ]
+            render_local_plots(explanation, sample_plot_paths, figsize=SHAP_PLOT_SIZE, dpi=SHAP_PLOT_DPI, n_workers=N_WORKERS)
+        elif SHAP_LOCAL_OUTPUT in ("parquet", "html"):
+            row_index = pd.DataFrame({
+                "Year": test_year_list[explained_rows],
+                "Month": test_month_list[explained_rows],
+                "FIPS": test_FIPS_list[explained_rows],
+            })
+            write_local_table(explanation, row_index, f"{LOCAL_SHAP_TABLE_PATH}.{SHAP_LOCAL_OUTPUT}")
+
+
+if __name__ == "__main__":
+    main()
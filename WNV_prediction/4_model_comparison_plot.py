@@ -1,58 +1,77 @@
 import os
+
+import matplotlib
 import pandas as pd
-from matplotlib import pyplot as plt
+
+# Set WNV_SHOW_PLOTS=1 to also open the figures in a window; by default they are only saved,
+# with the non-interactive Agg backend, so the script can run in a scheduled job
+SHOW_PLOTS = os.environ.get("WNV_SHOW_PLOTS", "0") == "1"
+if not SHOW_PLOTS:
+    matplotlib.use("Agg")
+
+from matplotlib import pyplot as plt  # noqa: E402
 
 # Define base directory and paths
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.environ.get("WNV_BASE_DIR", os.path.dirname(os.path.abspath(__file__)))
 RESULTS_DIR = os.path.join(BASE_DIR, "results", "plots")
-os.makedirs(RESULTS_DIR, exist_ok=True)
-
-# Define file paths for model results
-svm_results_path = os.path.join(
-    BASE_DIR, "data", "SVM", "hyperparameter_tuning_q2_rmse.csv"
-)
-rf_results_path = os.path.join(
-    BASE_DIR, "data", "RF", "hyperparameter_tuning_q2_rmse.csv"
-)
-hgbr_results_path = os.path.join(
-    BASE_DIR, "data", "HGBR", "hgbr_tuning_q2_rmse.csv"
-)
-
-# Load results
-svm_results = pd.read_csv(svm_results_path)
-rf_results = pd.read_csv(rf_results_path)
-hgbr_results = pd.read_csv(hgbr_results_path)
-
-# Plot Q^2 comparison between SVM, RF, and HGBR
-plt.figure(figsize=(10, 5))
-
-plt.plot(svm_results["tuning_year"], svm_results["q2"], label="SVM", color="red")
-plt.plot(rf_results["tuning_year"], rf_results["q2"], label="RF", color="blue")
-plt.plot(hgbr_results["tuning_year"], hgbr_results["q2"], label="HGBR", color="green")
-
-plt.xlabel("Tuning year")
-plt.ylabel("$Q^2$")
-plt.title("$Q^2$ Comparison Between SVM, RF, and HGBR")
-plt.xticks(svm_results["tuning_year"].astype(int))
-plt.legend(loc="upper left")
-
-q2_comparison_path = os.path.join(RESULTS_DIR, "multi_models_q2_comparison.png")
-plt.savefig(q2_comparison_path, dpi=300)
-plt.show()
-
-# Plot RMSE comparison between SVM, RF, and HGBR
-plt.figure(figsize=(10, 5))
-
-plt.plot(svm_results["tuning_year"], svm_results["RMSE"], label="SVM", color="red")
-plt.plot(rf_results["tuning_year"], rf_results["RMSE"], label="RF", color="blue")
-plt.plot(hgbr_results["tuning_year"], hgbr_results["RMSE"], label="HGBR", color="green")
-
-plt.xlabel("Tuning year")
-plt.ylabel("RMSE")
-plt.title("RMSE Comparison Between SVM, RF, and HGBR")
-plt.xticks(svm_results["tuning_year"].astype(int))
-plt.legend(loc="upper left")
-
-rmse_comparison_path = os.path.join(RESULTS_DIR, "multi_models_rmse_comparison.png")
-plt.savefig(rmse_comparison_path, dpi=300)
-plt.show()
\ No newline at end of file
+
+# Define file paths for model results, as written by 7_model_backtest.py
+RESULTS_PATHS = {
+    "SVM": os.path.join(BASE_DIR, "data", "SVM", "hyperparameter_tuning_q2_rmse.csv"),
+    "RF": os.path.join(BASE_DIR, "data", "RF", "hyperparameter_tuning_q2_rmse.csv"),
+    "HGBR": os.path.join(BASE_DIR, "data", "HGBR", "hgbr_tuning_q2_rmse.csv"),
+}
+COLORS = {"SVM": "red", "RF": "blue", "HGBR": "green"}
+Q2_COMPARISON_PATH = os.path.join(RESULTS_DIR, "multi_models_q2_comparison.png")
+RMSE_COMPARISON_PATH = os.path.join(RESULTS_DIR, "multi_models_rmse_comparison.png")
+
+
+def load_results():
+    """
+    {family: results} of the model families whose backtest table exists; the others are skipped.
+    """
+    results = {}
+    for family, path in RESULTS_PATHS.items():
+        if os.path.exists(path):
+            results[family] = pd.read_csv(path)
+        else:
+            print(f"Skipping {family}: no backtest results at {path}")
+    if not results:
+        raise FileNotFoundError(f"No backtest results found; run 7_model_backtest.py to write {list(RESULTS_PATHS.values())}")
+    return results
+
+
+def plot_comparison(results, metric, ylabel, path):
+    """
+    Plot one metric per tuning year for each model family in results and save the figure to path.
+    """
+    plt.figure(figsize=(10, 5))
+
+    for family, table in results.items():
+        plt.plot(table["tuning_year"], table[metric], label=family, color=COLORS[family])
+
+    plt.xlabel("Tuning year")
+    plt.ylabel(ylabel)
+    plt.title(f"{ylabel} Comparison Between {', '.join(results)}")
+    plt.xticks(sorted({int(year) for table in results.values() for year in table["tuning_year"]}))
+    plt.legend(loc="upper left")
+
+    plt.savefig(path, dpi=300)
+    if SHOW_PLOTS:
+        plt.show()
+    plt.close()
+
+
+def main():
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+
+    # Load the results of every family the backtest produced
+    results = load_results()
+
+    # Plot Q^2 and RMSE comparison between the model families
+    plot_comparison(results, "q2", "$Q^2$", Q2_COMPARISON_PATH)
+    plot_comparison(results, "RMSE", "RMSE", RMSE_COMPARISON_PATH)
+
+
+if __name__ == "__main__":
+    main()
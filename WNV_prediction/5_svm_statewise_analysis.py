@@ -1,115 +1,115 @@
 import os
 import pandas as pd
-from sklearn.svm import SVR
-from sklearn.preprocessing import StandardScaler
-from sklearn.utils import resample
-from sklearn import metrics
-from plotly.subplots import make_subplots
-import plotly.graph_objects as go
-
-# Set base directory and output directory
-BASE_DIR = "/Users/ericliao/Desktop/WNV_project_files/WNV/CDC_data"
-RESULT_DIR = os.path.join(BASE_DIR, "human/result/SVM_each_state_subsampling")
-os.makedirs(RESULT_DIR, exist_ok=True)
-
-# Load dataset
-data_path = os.path.join(BASE_DIR, "human/cdc_human_1999_to_2023/WNV_human_and_non_human_yearly_climate_demographic_bird.csv")
-data = pd.read_csv(data_path, index_col=0)
 
-# Clean and preprocess the population column
-data["Population"] = data["Population"].str.replace(",", "").str.strip()
-data["Population"] = pd.to_numeric(data["Population"], errors='coerce')
+from wnv_io import ensure_parquet
+from wnv_models import regressor_from_env
+from wnv_profiling import profiled_main
+from wnv_statewise import read_state_blocks, run_states
 
-# Function to balance classes by subsampling
-def balance_classes(data, target_column):
-    """
-    Balances the dataset classes by downsampling the majority class
-    or upsampling the minority class to match the smaller class size.
-    """
-    majority = data[data[target_column] == 0]
-    minority = data[data[target_column] > 0]
-
-    if len(majority) > len(minority):
-        majority_downsampled = resample(majority, replace=False, n_samples=len(minority), random_state=123)
-        return pd.concat([majority_downsampled, minority])
-    else:
-        minority_upsampled = resample(minority, replace=True, n_samples=len(majority), random_state=123)
-        return pd.concat([majority, minority_upsampled])
-
-# Function to train and evaluate an SVM model
-def svm_model(data, target_column, state):
-    """
-    Trains an SVM model for a specific state and evaluates it on test data.
-    """
-    state_data = data[data["State"] == state]
-    date_index = state_data.columns.get_loc("Date")
-
-    predictors = state_data.iloc[:, date_index + 1:].copy()
-    predictors['Year'] = state_data['Year']
-    predictors[target_column] = state_data[target_column]
-    predictors = predictors.dropna().reset_index(drop=True)
-
-    # Balance classes
-    predictors = balance_classes(predictors, target_column)
-
-    # Train/test split
-    train = predictors[predictors["Year"] < 2018]
-    test = predictors[predictors["Year"] >= 2018]
-
-    train_labels = train.pop(target_column).values
-    test_labels = test.pop(target_column).values
-    train.pop("Year")
-    test.pop("Year")
-
-    if train.empty or test.empty:
-        print(f"State: {state} has no data for training or testing.")
-        return None, None, None, None, None
-
-    # Standardize data
-    scaler = StandardScaler()
-    train = scaler.fit_transform(train)
-    test = scaler.transform(test)
-
-    # Train SVM model
-    model = SVR(epsilon=0.3, gamma=0.002, kernel="rbf", C=100)
-    model.fit(train, train_labels)
-    predictions = model.predict(test)
-    predictions = [max(0, p) for p in predictions]
-
-    # Calculate evaluation metrics
-    mse = metrics.mean_squared_error(test_labels, predictions)
-    msle = metrics.mean_squared_log_error(test_labels, predictions)
-    q2 = metrics.r2_score(test_labels, predictions)
-
-    print(f"State: {state}, MSE: {mse}, MSLE: {msle}, Q2: {q2}")
-    return mse, msle, q2, len(predictors), len(predictors[predictors[target_column] > 0])
-
-# Evaluate SVM for each state
-state_results = {}
-for state in data["State"].unique():
-    mse, msle, q2, total_rows, non_zero_rows = svm_model(data, "Neuroinvasive_disease_cases", state)
-    if mse is not None:
-        state_results[state] = {"mse": mse, "msle": msle, "q2": q2, "total_rows": total_rows, "non_zero_rows": non_zero_rows}
-
-# Prepare results for visualization
-results_df = pd.DataFrame.from_dict(state_results, orient='index').reset_index()
-results_df.rename(columns={"index": "State"}, inplace=True)
+# Set base directory (overridable with WNV_CDC_DATA_DIR) and output directory
+BASE_DIR = os.environ.get("WNV_CDC_DATA_DIR", "/Users/ericliao/Desktop/WNV_project_files/WNV/CDC_data")
+RESULT_DIR = os.path.join(BASE_DIR, "human/result/SVM_each_state_subsampling")
+# WNV_STATEWISE_DATA and WNV_STATEWISE_TARGET switch to another State-partitioned dataset, e.g. the output
+# of 8_national_wnv_prep.py with Human_Disease_Count as the target
+DATA_PATH = os.environ.get(
+    "WNV_STATEWISE_DATA",
+    os.path.join(BASE_DIR, "human/cdc_human_1999_to_2023/WNV_human_and_non_human_yearly_climate_demographic_bird.csv"),
+)
+TARGET_COLUMN = os.environ.get("WNV_STATEWISE_TARGET", "Neuroinvasive_disease_cases")
+CHECKPOINT_PATH = os.path.join(RESULT_DIR, "state_results.jsonl")
+
+MODEL_PARAMS = dict(epsilon=0.3, gamma=0.002, kernel="rbf", C=100)
+
+# State runner settings, overridable from the environment: worker processes, per-state
+# time limit in seconds (0 for none), and whether to resume from the checkpoint
+N_WORKERS = int(os.environ.get("WNV_N_WORKERS", os.cpu_count()))
+STATE_TIMEOUT = float(os.environ.get("WNV_STATE_TIMEOUT", 0))
+RESUME = os.environ.get("WNV_RESUME", "0") == "1"
+
+# Uncertainty mode: balance-and-fit replicates per state (1 reproduces the single draw), replicates
+# per scheduled task, and "exact" or "precomputed" kernel evaluation within a task
+N_REPLICATES = int(os.environ.get("WNV_STATE_REPLICATES", 1))
+REPLICATE_CHUNK = int(os.environ.get("WNV_STATE_REPLICATE_CHUNK", 10))
+
+# Regressor backend, number of approximate kernel features and kernel mode (WNV_SVR_BACKEND,
+# WNV_SVR_COMPONENTS, WNV_KERNEL_MODE), validated together
+SVR_BACKEND, SVR_COMPONENTS, KERNEL_MODE = regressor_from_env()
 
 # Map full state names to abbreviations
 state_map = {  # Add more states as necessary
     "alabama": "AL", "california": "CA", "texas": "TX", "new york": "NY"
 }
-results_df["State"] = results_df["State"].map(state_map)
 
-# Visualize results
+
+# Visualize results, with 95% confidence interval error bars when the data has <y_col>_lower/_upper columns
 def create_plot(data, x_col, y_col, title, file_name):
-    fig = go.Figure(data=go.Bar(x=data[x_col], y=data[y_col], name=y_col))
+    # plotly is only needed for the plots, so it is not imported before the states have been fitted
+    import plotly.graph_objects as go
+
+    error_y = None
+    if f"{y_col}_lower" in data and (data[f"{y_col}_upper"] > data[f"{y_col}_lower"]).any():
+        error_y = dict(
+            type="data",
+            symmetric=False,
+            array=data[f"{y_col}_upper"] - data[y_col],
+            arrayminus=data[y_col] - data[f"{y_col}_lower"],
+        )
+    fig = go.Figure(data=go.Bar(x=data[x_col], y=data[y_col], name=y_col, error_y=error_y))
     fig.update_layout(title_text=title, height=600, width=1000)
     fig.write_image(os.path.join(RESULT_DIR, file_name), scale=2)
 
-create_plot(results_df, "State", "msle", "MSLE by State Using SVM with Subsampling", "msle_by_state.png")
-create_plot(results_df, "State", "q2", "Q2 by State Using SVM with Subsampling", "q2_by_state.png")
 
-# Filter positive Q2 results and visualize
-positive_q2_df = results_df[results_df["q2"] > 0]
-create_plot(positive_q2_df, "State", "q2", "Positive Q2 by State Using SVM with Subsampling", "positive_q2_by_state.png")
\ No newline at end of file
+def clean_population(data):
+    """
+    Parse the Population column, which the CDC export stores as text with thousands separators.
+    """
+    if not pd.api.types.is_numeric_dtype(data["Population"]):
+        data["Population"] = pd.to_numeric(data["Population"].str.replace(",", "").str.strip(), errors='coerce')
+    return data
+
+
+@profiled_main("5_svm_statewise_analysis")
+def main(recorder):
+
+    os.makedirs(RESULT_DIR, exist_ok=True)
+
+    # Convert the dataset to Parquet partitioned by State, unless it already is a Parquet dataset
+    if os.path.exists(DATA_PATH):
+        ensure_parquet(DATA_PATH, ["State"], index_col=0)
+
+    # Evaluate SVM for each state: the dataset is read one state at a time with the population column
+    # cleaned, and the states' replicates are fitted in parallel, balancing classes by subsampling inside each worker
+    blocks = read_state_blocks(DATA_PATH, TARGET_COLUMN, index_col=0, prepare=clean_population)
+    with recorder.stage("statewise_fit") as stage:
+        records = run_states(
+            blocks, MODEL_PARAMS, n_workers=N_WORKERS, timeout=STATE_TIMEOUT or None,
+            checkpoint_path=CHECKPOINT_PATH, resume=RESUME,
+            n_replicates=N_REPLICATES, chunk_size=REPLICATE_CHUNK, kernel_mode=KERNEL_MODE,
+            backend=SVR_BACKEND, n_components=SVR_COMPONENTS,
+        )
+        stage["rows"] = len(records)
+    state_results = {
+        state: {key: value for key, value in record.items() if key not in ("state", "status")}
+        for state in sorted(records)
+        if (record := records.get(state)) and record["status"] == "ok"
+    }
+    skipped = {state: record["status"] for state, record in records.items() if record["status"] in ("timeout", "error")}
+    if skipped:
+        print(f"States left out of the report: {skipped}")
+
+    # Prepare results for visualization
+    results_df = pd.DataFrame.from_dict(state_results, orient='index').reset_index()
+    results_df.rename(columns={"index": "State"}, inplace=True)
+    results_df["State"] = results_df["State"].map(state_map)
+
+    with recorder.stage("plotting", rows=len(results_df)):
+        create_plot(results_df, "State", "msle", "MSLE by State Using SVM with Subsampling", "msle_by_state.png")
+        create_plot(results_df, "State", "q2", "Q2 by State Using SVM with Subsampling", "q2_by_state.png")
+
+        # Filter positive Q2 results and visualize
+        positive_q2_df = results_df[results_df["q2"] > 0]
+        create_plot(positive_q2_df, "State", "q2", "Positive Q2 by State Using SVM with Subsampling", "positive_q2_by_state.png")
+
+
+if __name__ == "__main__":
+    main()
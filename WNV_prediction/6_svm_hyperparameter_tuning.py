@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+
+from wnv_design import drop_uninformative_columns
+from wnv_io import read_features
+from wnv_profiling import profiled_main
+from wnv_tuning import tune
+
+# Set the base directory for relative paths
+BASE_DIR = os.environ.get("WNV_BASE_DIR", os.path.dirname(os.path.abspath(__file__)))
+
+# Define file paths; the best hyperparameters go where the bootstrap and SHAP scripts read them
+DATA_PATH = os.path.join(BASE_DIR, "data", "CA_13_county_dataset", "CA_13_counties_04_23_no_impute_daylight.csv")
+RESULTS_DIR = os.path.join(BASE_DIR, "results", "SVM")
+HYPERPARAMS_PATH = os.path.join(RESULTS_DIR, "hyperparameter_tuning_best.csv")
+SEARCH_RESULTS_PATH = os.path.join(RESULTS_DIR, "hyperparameter_tuning_search.csv")
+FOLD_CACHE_DIR = os.environ.get("WNV_FOLD_CACHE_DIR", os.path.join(RESULTS_DIR, "tuning_folds"))
+
+# Tuning years as "first-last" or a comma-separated list; each is validated on its own year after
+# training on the years before it, and all of them lie before the 2019 test years
+TUNING_YEARS = os.environ.get("WNV_TUNING_YEARS", "2009-2018")
+
+# Search settings: random candidates per year, the halving factor between rounds, the validation score,
+# the sampling seed and the worker processes fitting each round's candidates
+N_CANDIDATES = int(os.environ.get("WNV_TUNING_CANDIDATES", 200))
+HALVING_FACTOR = int(os.environ.get("WNV_TUNING_FACTOR", 3))
+SCORING = os.environ.get("WNV_TUNING_SCORING", "r2")
+SEED = int(os.environ.get("WNV_TUNING_SEED", 0))
+N_WORKERS = int(os.environ.get("WNV_N_WORKERS", os.cpu_count()))
+
+
+def parse_years(years):
+    if "-" in years:
+        first, last = years.split("-")
+        return list(range(int(first), int(last) + 1))
+    return [int(year) for year in years.split(",")]
+
+
+@profiled_main("6_svm_hyperparameter_tuning")
+def main(recorder):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    tuning_years = parse_years(TUNING_YEARS)
+
+    # Load the dataset without the unnecessary columns and target columns
+    with recorder.stage("csv_load") as stage:
+        data = read_features(
+            DATA_PATH, exclude=["Date", "County", "Latitude", "Longitude", "Total_Bird_WNV_Count", "Mos_WNV_Count", "Horse_WNV_Count"],
+        )
+        stage["rows"] = len(data)
+
+    # Drop columns with all NaN or zero variance over every year, so the tuned hyperparameters are for
+    # the columns the SHAP script fits them on, then keep the tuning years and impute the target column
+    data = drop_uninformative_columns(data)
+    data = data[data["Year"] <= max(tuning_years)].copy()
+    data["Human_Disease_Count"] = data["Human_Disease_Count"].fillna(0)
+    data = data.dropna().reset_index(drop=True)
+
+    # Separate labels, years and features
+    y = data.pop("Human_Disease_Count").to_numpy(dtype=np.float64)
+    years = data.pop("Year").to_numpy()
+    X = data.drop(columns=["Month", "FIPS"]).to_numpy(dtype=np.float64)
+
+    # Search each tuning year on its rolling-origin fold
+    with recorder.stage("tuning", rows=len(X)):
+        best, results = tune(
+            X, y, years, tuning_years, n_candidates=N_CANDIDATES, factor=HALVING_FACTOR, scoring=SCORING,
+            n_workers=N_WORKERS, seed=SEED, cache_dir=FOLD_CACHE_DIR,
+        )
+
+    # Save the best hyperparameters per tuning year and every fitted candidate
+    best.to_csv(HYPERPARAMS_PATH, index=False)
+    results.to_csv(SEARCH_RESULTS_PATH, index=False)
+    print(best.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import os
+
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+
+from wnv_backtest import FAMILIES, estimator_params, run_backtest
+from wnv_design import drop_uninformative_columns
+from wnv_io import read_features
+from wnv_models import regressor_from_env
+from wnv_profiling import profiled_main
+
+# Set the base directory for relative paths
+BASE_DIR = os.environ.get("WNV_BASE_DIR", os.path.dirname(os.path.abspath(__file__)))
+
+# Define file paths: the dataset of the SHAP script, the per-tuning-year hyperparameters of each model
+# family, and the Q^2/RMSE tables read by 4_model_comparison_plot.py
+DATA_PATH = os.path.join(BASE_DIR, "data", "CA_13_county_dataset", "CA_13_counties_04_23_no_impute_daylight.csv")
+HYPERPARAMS_PATHS = {
+    family: os.path.join(BASE_DIR, "results", family, "hyperparameter_tuning_best.csv") for family in FAMILIES
+}
+RESULTS_PATHS = {
+    "SVM": os.path.join(BASE_DIR, "data", "SVM", "hyperparameter_tuning_q2_rmse.csv"),
+    "RF": os.path.join(BASE_DIR, "data", "RF", "hyperparameter_tuning_q2_rmse.csv"),
+    "HGBR": os.path.join(BASE_DIR, "data", "HGBR", "hgbr_tuning_q2_rmse.csv"),
+}
+
+# Model families to backtest, e.g. "SVM,RF"; by default every family whose hyperparameter table exists.
+# Only the SVM table is written in this repo (by 6_svm_hyperparameter_tuning.py)
+BACKTEST_FAMILIES = os.environ.get("WNV_BACKTEST_FAMILIES")
+
+# Thread budget shared by all jobs (default: all cores) and the threads of each RF/HGBR job;
+# SVR jobs take one thread each
+THREAD_BUDGET = int(os.environ.get("WNV_THREAD_BUDGET", os.cpu_count()))
+TREE_THREADS = int(os.environ.get("WNV_TREE_THREADS", 4))
+
+# SVR backend and number of approximate kernel features, as in the other SVM scripts
+SVR_BACKEND, SVR_COMPONENTS, _ = regressor_from_env()
+
+
+def backtest_families():
+    """
+    Model families to backtest; raises FileNotFoundError naming any missing hyperparameter table.
+    """
+    if BACKTEST_FAMILIES:
+        families = BACKTEST_FAMILIES.split(",")
+        unknown = [family for family in families if family not in FAMILIES]
+        if unknown:
+            raise ValueError(f"Unknown model families {unknown}, expected some of {list(FAMILIES)}")
+    else:
+        families = [family for family in FAMILIES if os.path.exists(HYPERPARAMS_PATHS[family])]
+        for family in FAMILIES:
+            if family not in families:
+                print(f"Skipping {family}: no hyperparameter table at {HYPERPARAMS_PATHS[family]}")
+        if not families:
+            raise FileNotFoundError(
+                f"No hyperparameter tables found; run 6_svm_hyperparameter_tuning.py to write {HYPERPARAMS_PATHS['SVM']}"
+            )
+
+    missing = [HYPERPARAMS_PATHS[family] for family in families if not os.path.exists(HYPERPARAMS_PATHS[family])]
+    if missing:
+        raise FileNotFoundError(f"Missing hyperparameter tables: {missing}")
+    return families
+
+
+@profiled_main("7_model_backtest")
+def main(recorder):
+
+    # Check the hyperparameter tables before loading the data
+    families = backtest_families()
+
+    # Load the dataset without the unnecessary columns and target columns
+    with recorder.stage("csv_load") as stage:
+        data = read_features(DATA_PATH, exclude=["Date", "County", "Latitude", "Longitude", "Total_Bird_WNV_Count", "Mos_WNV_Count", "Horse_WNV_Count"])
+        stage["rows"] = len(data)
+
+    # Drop columns with all NaN or zero variance and impute missing values in the target column
+    data = drop_uninformative_columns(data)
+    data["Human_Disease_Count"] = data["Human_Disease_Count"].fillna(0)
+
+    # Split data into training and testing sets, separate labels and drop non-feature columns
+    train = data[data['Year'] < 2019].dropna().reset_index(drop=True)
+    test = data[data['Year'] >= 2019].dropna().reset_index(drop=True)
+    train_labels = train.pop("Human_Disease_Count").values
+    test_labels = test.pop("Human_Disease_Count").values
+    train.drop(columns=["Month", "FIPS", "Year"], inplace=True)
+    test.drop(columns=["Month", "FIPS", "Year"], inplace=True)
+
+    # Scale data once for every model family
+    scaler = StandardScaler()
+    train = scaler.fit_transform(train)
+    test = scaler.transform(test)
+
+    # One job per model family and tuning year
+    hyperparameters = {family: pd.read_csv(HYPERPARAMS_PATHS[family]) for family in families}
+    jobs = {
+        (family, index): (family, estimator_params(row))
+        for family, table in hyperparameters.items()
+        for index, row in table.iterrows()
+    }
+
+    # Fit every job across the pool within the thread budget
+    with recorder.stage("backtest", rows=len(jobs)):
+        scores = run_backtest(
+            jobs, train, train_labels, test, test_labels, thread_budget=THREAD_BUDGET, tree_threads=TREE_THREADS,
+            backend=SVR_BACKEND, n_components=SVR_COMPONENTS,
+        )
+
+    # Save one table per family: tuning_year, q2, RMSE and the hyperparameters
+    for family, table in hyperparameters.items():
+        results = pd.DataFrame(
+            [scores[(family, index)] for index in table.index], columns=["q2", "RMSE"], index=table.index
+        )
+        results.insert(0, "tuning_year", table["tuning_year"])
+        results = results.join(table.drop(columns="tuning_year"))
+        os.makedirs(os.path.dirname(RESULTS_PATHS[family]), exist_ok=True)
+        results.to_csv(RESULTS_PATHS[family], index=False)
+        print(f"{family}:")
+        print(results[["tuning_year", "q2", "RMSE"]].to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
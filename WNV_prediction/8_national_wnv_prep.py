@@ -0,0 +1,65 @@
+import os
+
+import pandas as pd
+
+from wnv_io import ensure_parquet
+from wnv_prep import normalize_names, prepare_states
+from wnv_profiling import profiled_main
+
+# Set the base directory for relative paths
+BASE_DIR = os.environ.get("WNV_BASE_DIR", os.path.dirname(os.path.abspath(__file__)))
+
+# Define relative paths; the case and CDC files are converted once to Parquet datasets partitioned by State,
+# so each worker reads only its state
+CASES_DATA_PATH = os.environ.get(
+    "WNV_NATIONAL_CASES", os.path.join(BASE_DIR, "data", "monthly", "wnv_county_onsetmonth_national.csv")
+)
+LOCATIONS_DATA_PATH = os.environ.get("WNV_COUNTY_LOCATIONS", os.path.join(BASE_DIR, "data", "county_locations.csv"))
+POPULATION_DATA_PATH = os.path.join(BASE_DIR, "data", "yearly", "disease_human_neuroinvasive_whole_year.csv")
+CDC_DATA_PATH = os.path.join(BASE_DIR, "data", "monthly", "combine_cdc_all_environmental_variable_all_2024.csv")
+ENSO_DATA_PATH = os.path.join(BASE_DIR, "data", "Historical_El_Nino_or_La_Nina_episodes_1950_present.csv")
+LAND_USE_DATA_PATH = os.path.join(BASE_DIR, "data", "climate", "consensus_land_cover_data")
+CLIMATE_DATA_PATH = os.path.join(BASE_DIR, "data", "climate", "new_land_monthly_data_from_1999_to_2024_02.nc")
+OUTPUT_DATASET_PATH = os.environ.get(
+    "WNV_NATIONAL_OUTPUT", os.path.join(BASE_DIR, "data", "national_dataset", "US_counties_monthly.parquet")
+)
+
+# Years of the Year x Month x County grid, states to (re)build (comma-separated, default all),
+# counties per task and worker processes
+START_YEAR = int(os.environ.get("WNV_PREP_START_YEAR", 2004))
+END_YEAR = int(os.environ.get("WNV_PREP_END_YEAR", 2023))
+STATES = os.environ.get("WNV_PREP_STATES")
+COUNTIES_PER_CHUNK = int(os.environ.get("WNV_PREP_COUNTIES_PER_CHUNK", 200))
+N_WORKERS = int(os.environ.get("WNV_N_WORKERS", os.cpu_count()))
+
+# On-disk cache for the land use and climate lookups, shared by the workers; set WNV_FEATURE_CACHE
+# to an empty string to disable it
+FEATURE_CACHE_PATH = os.environ.get("WNV_FEATURE_CACHE", os.path.join(BASE_DIR, "data", "feature_cache.sqlite"))
+
+
+@profiled_main("8_national_wnv_prep")
+def main(recorder):
+
+    # Convert the large per-county-month inputs to State-partitioned Parquet, and load the small national tables
+    with recorder.stage("input_load"):
+        ensure_parquet(CASES_DATA_PATH, ["State"])
+        ensure_parquet(CDC_DATA_PATH, ["State"])
+        locations = pd.read_csv(LOCATIONS_DATA_PATH)
+        population = pd.read_csv(POPULATION_DATA_PATH).query("Year == 2020")[["State", "County", "Population"]]
+        enso = pd.read_csv(ENSO_DATA_PATH)
+
+    # Prepare every state in parallel, each worker writing its State/Year partitions
+    states = normalize_names(pd.Series(STATES.split(","))).tolist() if STATES else None
+    with recorder.stage("prepare_states") as stage:
+        rows = prepare_states(
+            {"cases": CASES_DATA_PATH, "cdc": CDC_DATA_PATH, "land_use": LAND_USE_DATA_PATH, "climate": CLIMATE_DATA_PATH},
+            locations, population, enso, START_YEAR, END_YEAR, OUTPUT_DATASET_PATH,
+            states=states, counties_per_chunk=COUNTIES_PER_CHUNK, n_workers=N_WORKERS,
+            cache_path=FEATURE_CACHE_PATH or None,
+        )
+        stage["rows"] = sum(rows.values())
+    print(f"Wrote {sum(rows.values())} rows for {len(rows)} states to {OUTPUT_DATASET_PATH}")
+
+
+if __name__ == "__main__":
+    main()
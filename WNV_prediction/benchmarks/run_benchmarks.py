@@ -0,0 +1,278 @@
+"""
+Benchmark harness for the WNV pipeline stages.
+
+Synthetic inputs are generated once into a work directory, then each stage
+runs in its own Python process so its timings and peak memory are not
+affected by the other stages. Every stage reports wall time, CPU time
+(including worker processes), peak resident memory of the stage process and
+of its largest worker, and optionally the tracemalloc peak of Python
+allocations. Results are written as JSON for tracking across commits.
+
+    python run_benchmarks.py --counties 13 --years 20 --features 20 --output results.json
+    python run_benchmarks.py --stages bootstrap shap --counties 100 --iterations 200
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+# Importing synthetic also puts the wnv_* modules on the path
+import synthetic
+from wnv_profiling import cpu_seconds, max_rss_mb
+
+STAGES = ("prep", "bootstrap", "shap", "statewise")
+# The synthetic data ends with the scripts' last year, so the test years (2018/2019 on) are always present
+END_YEAR = 2023
+
+
+def prepare(workdir, args):
+    """
+    Generate the synthetic input files for the requested stages into workdir.
+    """
+    start_year = END_YEAR - args.years + 1
+    if "prep" in args.stages:
+        synthetic.county_cases(args.counties, start_year, END_YEAR, args.seed).to_parquet(
+            os.path.join(workdir, "cases.parquet")
+        )
+        synthetic.county_locations(args.counties, args.seed).to_parquet(os.path.join(workdir, "locations.parquet"))
+        synthetic.county_population(args.counties, args.seed).to_parquet(os.path.join(workdir, "population.parquet"))
+        synthetic.county_cdc_counts(args.counties, start_year, END_YEAR, args.seed).to_parquet(
+            os.path.join(workdir, "cdc.parquet")
+        )
+        synthetic.enso_table(start_year - 1, END_YEAR, args.seed).to_csv(os.path.join(workdir, "enso.csv"), index=False)
+        synthetic.write_land_cover_rasters(os.path.join(workdir, "land_cover"), args.raster_width, args.seed)
+        synthetic.write_climate_netcdf(
+            os.path.join(workdir, "climate.nc"), start_year - 1, END_YEAR, args.climate_resolution, seed=args.seed
+        )
+    if "bootstrap" in args.stages or "shap" in args.stages:
+        synthetic.county_month_dataset(args.counties, start_year, END_YEAR, args.features, args.seed).to_parquet(
+            os.path.join(workdir, "county_month.parquet")
+        )
+    if "statewise" in args.stages:
+        synthetic.national_cdc_table(
+            args.states, args.counties, start_year, END_YEAR, args.features, args.seed
+        ).to_parquet(os.path.join(workdir, "national.parquet"))
+
+
+def _train_test(workdir, features):
+    from wnv_design import build_design_matrix
+
+    data = pd.read_parquet(os.path.join(workdir, "county_month.parquet"))
+    data = data[["Year", "Human_Disease_Count"] + [f"feature_{i}" for i in range(features)]]
+    test_year = data["Year"].max()
+    X_train, y_train, _ = build_design_matrix(data[data["Year"] < test_year], "Human_Disease_Count", ["Year"])
+    X_test, y_test, feature_names = build_design_matrix(data[data["Year"] == test_year], "Human_Disease_Count", ["Year"])
+    return X_train, y_train, X_test, y_test, feature_names
+
+
+def _stage_prep(workdir, args):
+    from wnv_prep import add_features, base_table, normalize_names
+
+    cases = pd.read_parquet(os.path.join(workdir, "cases.parquet"))
+    locations = pd.read_parquet(os.path.join(workdir, "locations.parquet"))
+    population = pd.read_parquet(os.path.join(workdir, "population.parquet"))
+    cdc = pd.read_parquet(os.path.join(workdir, "cdc.parquet"))
+    enso = pd.read_csv(os.path.join(workdir, "enso.csv"))
+    start_year = END_YEAR - args.years + 1
+
+    def run():
+        # The path of script 1 from the loaded inputs: name normalization, the county-month grid and joins,
+        # then the ENSO, land-cover and climate features
+        data = base_table(
+            cases.assign(County=normalize_names(cases["County"])),
+            locations,
+            population.assign(County=normalize_names(population["County"])),
+            cdc, start_year, END_YEAR, counties=locations["County"],
+        )
+        data = add_features(data, enso, os.path.join(workdir, "land_cover"), os.path.join(workdir, "climate.nc"))
+        return len(data)
+
+    return run
+
+
+def _stage_bootstrap(workdir, args):
+    from wnv_bootstrap import run_bootstrap
+
+    X_train, y_train, X_test, y_test, _ = _train_test(workdir, args.features)
+    model_params = dict(C=0.660013053582507, epsilon=0.188805559508538, gamma="auto", kernel="poly")
+
+    def run():
+        results = run_bootstrap(
+            X_train, y_train, X_test, y_test, model_params,
+            n_iterations=args.iterations, n_workers=args.workers, kernel_mode=args.kernel_mode,
+        )
+        for _ in results:
+            pass
+        return len(X_train) * args.iterations
+
+    return run
+
+
+def _stage_shap(workdir, args):
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.svm import SVR
+    from wnv_shap import explain
+
+    X_train, y_train, X_test, _, feature_names = _train_test(workdir, args.features)
+    scaler = StandardScaler().fit(X_train)
+    model = SVR(C=0.660013053582507, epsilon=0.188805559508538, gamma="auto", kernel="poly")
+    model.fit(scaler.transform(X_train), y_train)
+    X_test = scaler.transform(X_test)
+
+    def run():
+        explanation, rows = explain(
+            model, X_test, feature_names, n_explain=args.explain_rows, nsamples=args.shap_nsamples,
+            n_workers=args.workers,
+        )
+        return len(rows)
+
+    return run
+
+
+def _stage_statewise(workdir, args):
+    from wnv_statewise import run_states, state_blocks
+
+    data = pd.read_parquet(os.path.join(workdir, "national.parquet"))
+    data["Population"] = pd.to_numeric(data["Population"].str.replace(",", ""), errors="coerce")
+    model_params = dict(epsilon=0.3, gamma=0.002, kernel="rbf", C=100)
+
+    def run():
+        run_states(
+            state_blocks(data, "Neuroinvasive_disease_cases"), model_params, n_workers=args.workers,
+            n_replicates=args.replicates, kernel_mode=args.kernel_mode,
+        )
+        return len(data) * args.replicates
+
+    return run
+
+
+def run_stage(stage, workdir, args):
+    """
+    Set up and measure one stage in this process, returning its result record.
+    """
+    run = globals()[f"_stage_{stage}"](workdir, args)
+    baseline_rss = max_rss_mb(resource.RUSAGE_SELF)
+    if args.tracemalloc:
+        tracemalloc.start()
+    cpu_start = cpu_seconds()
+    wall_start = time.perf_counter()
+    rows = run()
+    wall = time.perf_counter() - wall_start
+    cpu = cpu_seconds() - cpu_start
+
+    record = {
+        "stage": stage,
+        "rows": rows,
+        "wall_seconds": wall,
+        "cpu_seconds": cpu,
+        "baseline_rss_mb": baseline_rss,
+        "max_rss_mb": max_rss_mb(resource.RUSAGE_SELF),
+        "max_worker_rss_mb": max_rss_mb(resource.RUSAGE_CHILDREN),
+    }
+    if args.tracemalloc:
+        record["tracemalloc_peak_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return record
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the WNV pipeline stages on synthetic data.")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--counties", type=int, default=13)
+    parser.add_argument("--years", type=int, default=20)
+    parser.add_argument("--features", type=int, default=20)
+    parser.add_argument("--states", type=int, default=10, help="states in the national table (statewise stage)")
+    parser.add_argument("--iterations", type=int, default=100, help="bootstrap iterations")
+    parser.add_argument("--explain-rows", type=int, default=50, help="rows explained by the shap stage")
+    parser.add_argument("--shap-nsamples", type=int, default=200)
+    parser.add_argument("--replicates", type=int, default=1, help="balance-and-fit replicates per state")
+    parser.add_argument("--kernel-mode", choices=["exact", "precomputed"], default="exact")
+    parser.add_argument("--raster-width", type=int, default=3600, help="width of the land-cover rasters in pixels")
+    parser.add_argument("--climate-resolution", type=float, default=0.25, help="climate grid spacing in degrees")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tracemalloc", action="store_true", help="also record the peak of Python allocations (slower)")
+    parser.add_argument("--workdir", help="directory for the synthetic inputs (default: a temporary directory)")
+    parser.add_argument("--output", default="benchmark_results.json")
+    # Internal: run a single stage on the inputs prepared in --workdir and print its record
+    parser.add_argument("--child", choices=STAGES, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.child:
+        with open(os.path.join(args.workdir, "args.json")) as f:
+            stage_args = argparse.Namespace(**json.load(f))
+        print(json.dumps(run_stage(args.child, args.workdir, stage_args)))
+        return
+
+    with tempfile.TemporaryDirectory(prefix="wnv_bench_") as tmp:
+        workdir = args.workdir or tmp
+        os.makedirs(workdir, exist_ok=True)
+        print(f"Generating synthetic inputs in {workdir}...")
+        prepare(workdir, args)
+        with open(os.path.join(workdir, "args.json"), "w") as f:
+            json.dump(vars(args), f)
+
+        results = []
+        for stage in args.stages:
+            print(f"Running stage {stage}...")
+            completed = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", stage, "--workdir", workdir],
+                capture_output=True, text=True,
+            )
+            if completed.returncode != 0:
+                print(completed.stderr, file=sys.stderr)
+                results.append({"stage": stage, "error": completed.stderr.strip().splitlines()[-1:]})
+                continue
+            record = json.loads(completed.stdout.strip().splitlines()[-1])
+            print(f"  {record['wall_seconds']:.2f} s wall, {record['cpu_seconds']:.2f} s CPU, "
+                  f"{record['max_rss_mb']:.0f} MB peak RSS")
+            results.append(record)
+
+    report = {
+        "timestamp": pd.Timestamp.now(tz="UTC").isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "cpu_count": os.cpu_count(),
+        "scale": {
+            "counties": args.counties,
+            "years": args.years,
+            "features": args.features,
+            "states": args.states,
+            "iterations": args.iterations,
+            "explain_rows": args.explain_rows,
+            "replicates": args.replicates,
+            "workers": args.workers,
+            "kernel_mode": args.kernel_mode,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
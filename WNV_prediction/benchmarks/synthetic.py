@@ -0,0 +1,199 @@
+"""
+Synthetic stand-ins for the WNV input files.
+
+Every generator follows the schema the scripts read (column names, dtypes,
+file formats and georeferencing), with random values drawn from a seeded
+generator, so each pipeline stage can be run and measured at any scale
+without the private data files.
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import rasterio
+import xarray as xr
+from affine import Affine
+
+# The wnv_* modules live in the parent directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wnv_features import CLIMATE_VARIABLES, LAND_USE_TYPES, MONTH_NAMES  # noqa: E402
+from wnv_prep import CDC_COLUMNS  # noqa: E402
+
+# Bounding box (south, north, west, east) the synthetic counties are placed in, roughly California
+COUNTY_BOUNDS = (32.5, 42.0, -124.4, -114.1)
+
+
+def county_locations(n_counties, seed=0):
+    """
+    DataFrame of County, FIPS, Latitude, Longitude and Avian Phylodiversity for n_counties random counties.
+
+    This is the locations table of the prep scripts, with the county names in
+    their normalized (lower-case) form.
+    """
+    rng = np.random.default_rng(seed)
+    south, north, west, east = COUNTY_BOUNDS
+    return pd.DataFrame({
+        "County": [f"county_{i:04d}" for i in range(n_counties)],
+        "FIPS": 6001 + 2 * np.arange(n_counties),
+        "Latitude": np.round(rng.uniform(south, north, n_counties), 4),
+        "Longitude": np.round(rng.uniform(west, east, n_counties), 4),
+        "Avian Phylodiversity": np.round(rng.uniform(5, 40, n_counties), 2),
+    })
+
+
+def county_cases(n_counties, start_year, end_year, seed=0):
+    """
+    Raw case reports with County, Cases, Year and Month columns, as in the county onset-month file.
+
+    Most county-months have no report, and a county-month with cases may
+    have several reports, so base_table has both gaps to fill and duplicates
+    to sum. County names are title-cased, as in the raw file, and need
+    normalize_names before joining the other tables.
+    """
+    rng = np.random.default_rng(seed)
+    grid = county_month_grid(n_counties, start_year, end_year, seed)
+    # Reports peak in late summer
+    rate = 0.6 * np.exp(-((grid["Month"].to_numpy() - 8) ** 2) / 4)
+    reports = rng.poisson(rate)
+    cases = grid.loc[grid.index.repeat(reports), ["County", "Year", "Month"]].reset_index(drop=True)
+    cases["County"] = cases["County"].str.title()
+    cases.insert(1, "Cases", rng.integers(1, 4, len(cases)))
+    return cases
+
+
+def county_population(n_counties, seed=0):
+    """
+    County and Population of every county, with title-cased names as in the raw population file.
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "County": [f"County_{i:04d}" for i in range(n_counties)],
+        "Population": rng.integers(1_000, 10_000_000, n_counties),
+    })
+
+
+def county_cdc_counts(n_counties, start_year, end_year, seed=0):
+    """
+    CDC bird, mosquito and horse WNV counts per county-month, with the CDC_COLUMNS base_table joins.
+    """
+    rng = np.random.default_rng(seed)
+    cdc = county_month_grid(n_counties, start_year, end_year, seed)[["Year", "Month", "County"]]
+    for column in ["Total_Bird_WNV_Count", "Mos_WNV_Count", "Horse_WNV_Count"]:
+        cdc[column] = rng.poisson(2.0, len(cdc)).astype(float)
+    return cdc[CDC_COLUMNS]
+
+
+def county_month_grid(n_counties, start_year, end_year, seed=0):
+    """
+    One row per Year x Month x County, with the county coordinates, as the prep script builds it.
+    """
+    counties = county_locations(n_counties, seed)
+    grid = pd.DataFrame(
+        [(year, month) for year in range(start_year, end_year + 1) for month in range(1, 13)],
+        columns=["Year", "Month"],
+    )
+    return grid.merge(counties, how="cross")[["Year", "Month", "County", "FIPS", "Latitude", "Longitude"]]
+
+
+def county_month_dataset(n_counties, start_year, end_year, n_features, seed=0):
+    """
+    Prepared county-month dataset as scripts 2 and 3 read it.
+
+    Holds the identifier columns, the excluded count columns, a
+    Human_Disease_Count target that depends on the first few features, and
+    n_features numeric feature columns.
+    """
+    rng = np.random.default_rng(seed)
+    data = county_month_grid(n_counties, start_year, end_year, seed)
+    n = len(data)
+    features = rng.normal(size=(n, n_features))
+    signal = features[:, :min(3, n_features)].sum(axis=1) + np.sin(2 * np.pi * data["Month"].to_numpy() / 12)
+    data["Date"] = pd.to_datetime(data[["Year", "Month"]].assign(day=1)).dt.strftime("%Y-%m-%d")
+    data["Human_Disease_Count"] = rng.poisson(np.exp(np.clip(signal - 1, -5, 3))).astype(float)
+    for column in ["Total_Bird_WNV_Count", "Mos_WNV_Count", "Horse_WNV_Count"]:
+        data[column] = rng.poisson(2.0, n).astype(float)
+    data["Population"] = rng.integers(1_000, 10_000_000, n).astype(float)
+    for i in range(n_features):
+        data[f"feature_{i}"] = features[:, i]
+    return data
+
+
+def national_cdc_table(n_states, n_counties, start_year, end_year, n_features, seed=0):
+    """
+    National county-year table as the statewise script reads it.
+
+    Population is a string with thousands separators, as in the CDC export;
+    the feature columns follow Date, and Neuroinvasive_disease_cases is the target.
+    """
+    rng = np.random.default_rng(seed)
+    rows = [
+        (f"state_{s:02d}", f"county_{s:02d}_{c:03d}", year)
+        for s in range(n_states) for c in range(n_counties) for year in range(start_year, end_year + 1)
+    ]
+    data = pd.DataFrame(rows, columns=["State", "County", "Year"])
+    n = len(data)
+    features = rng.normal(size=(n, n_features))
+    data["Date"] = data["Year"].astype(str) + "-01-01"
+    data["Population"] = [f"{value:,}" for value in rng.integers(1_000, 10_000_000, n)]
+    for i in range(n_features):
+        data[f"feature_{i}"] = features[:, i]
+    # Mostly zero counts, as for most county-years
+    data["Neuroinvasive_disease_cases"] = np.where(
+        rng.random(n) < 0.3, rng.poisson(np.exp(np.clip(features[:, 0], -3, 2))) + 1, 0
+    ).astype(float)
+    return data
+
+
+def enso_table(start_year, end_year, seed=0):
+    """
+    ENSO episode table: one row per year with one ONI column per month name.
+    """
+    rng = np.random.default_rng(seed)
+    years = np.arange(start_year, end_year + 1)
+    table = pd.DataFrame(np.round(rng.normal(0, 1, (len(years), 12)), 1), columns=MONTH_NAMES)
+    table.insert(0, "Year", years)
+    return table
+
+
+def write_land_cover_rasters(directory, width=3600, seed=0):
+    """
+    Write the 12 consensus_full_class_<i>.tif rasters, single-band uint8, on the global land-cover grid.
+
+    The grid spans latitude 90 to -56 and longitude -180 to 180, as
+    land_cover_pixel_indices expects; the height follows from width.
+    """
+    rng = np.random.default_rng(seed)
+    height = int(round(width * 146 / 360))
+    os.makedirs(directory, exist_ok=True)
+    transform = Affine(360 / width, 0, -180, 0, -146 / height, 90)
+    for i in range(1, len(LAND_USE_TYPES) + 1):
+        path = os.path.join(directory, f"consensus_full_class_{i}.tif")
+        with rasterio.open(
+            path, "w", driver="GTiff", height=height, width=width, count=1, dtype="uint8",
+            crs="EPSG:4326", transform=transform, compress="deflate",
+        ) as dst:
+            dst.write(rng.integers(0, 101, (height, width), dtype=np.uint8), 1)
+    return directory
+
+
+def write_climate_netcdf(path, start_year, end_year, resolution=0.25, variables=CLIMATE_VARIABLES, seed=0):
+    """
+    Write a monthly climate cube (time, latitude, longitude) covering COUNTY_BOUNDS.
+
+    Latitude is descending and the time axis has one step per month, as in
+    the ERA5-Land monthly file.
+    """
+    rng = np.random.default_rng(seed)
+    south, north, west, east = COUNTY_BOUNDS
+    latitude = np.arange(np.ceil(north) + resolution, np.floor(south) - resolution, -resolution)
+    longitude = np.arange(np.floor(west) - resolution, np.ceil(east) + resolution, resolution)
+    time = pd.date_range(f"{start_year}-01-01", f"{end_year}-12-01", freq="MS")
+    shape = (len(time), len(latitude), len(longitude))
+    dataset = xr.Dataset(
+        {var: (("time", "latitude", "longitude"), rng.normal(size=shape).astype(np.float32)) for var in variables},
+        coords={"time": time, "latitude": latitude, "longitude": longitude},
+    )
+    dataset.to_netcdf(path)
+    return path
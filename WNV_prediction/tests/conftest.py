@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The wnv_* modules and numbered scripts live one directory up, next to the data folders
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
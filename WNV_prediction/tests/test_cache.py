@@ -0,0 +1,24 @@
+import os
+
+import wnv_cache
+from wnv_cache import FeatureCache
+
+
+def test_fingerprint_is_reused_across_runs_until_the_file_changes(tmp_path, monkeypatch):
+    source = tmp_path / "raster.tif"
+    source.write_bytes(b"a" * 4096)
+    hashed = []
+    digest = wnv_cache._file_digest.__wrapped__
+    monkeypatch.setattr(wnv_cache, "_file_digest", lambda *key: hashed.append(key) or digest(*key))
+
+    first = FeatureCache(str(tmp_path / "cache.sqlite")).fingerprint(str(source))
+    # A later run opens the database anew and recognizes the unchanged file from its stat
+    assert FeatureCache(str(tmp_path / "cache.sqlite")).fingerprint(str(source)) == first
+    assert len(hashed) == 1
+
+    # An in-place rewrite of the same size with a change in the middle gets a new fingerprint
+    source.write_bytes(b"a" * 2048 + b"b" + b"a" * 2047)
+    stat = source.stat()
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert FeatureCache(str(tmp_path / "cache.sqlite")).fingerprint(str(source)) != first
+    assert len(hashed) == 2
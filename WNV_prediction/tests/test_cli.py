@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+
+import pandas as pd
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPT_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, os.path.join(SCRIPT_DIR, "benchmarks"))
+
+import synthetic  # noqa: E402
+
+
+def _wnv(base_dir, *args):
+    env = {**os.environ, "WNV_BASE_DIR": str(base_dir), "WNV_SHOW_PLOTS": "0"}
+    return subprocess.run(
+        [sys.executable, os.path.join(SCRIPT_DIR, "wnv.py"), "--workers", "1", *args],
+        env=env, capture_output=True, text=True, timeout=600,
+    )
+
+
+def test_help_returns_without_running_a_command():
+    completed = subprocess.run([sys.executable, os.path.join(SCRIPT_DIR, "wnv.py"), "--help"], capture_output=True, text=True)
+    assert completed.returncode == 0
+    assert "statewise" in completed.stdout
+
+
+def test_compare_with_backtest_on_a_fresh_tree(tmp_path):
+    # A fresh tree: the dataset and the SVM hyperparameters of 6_svm_hyperparameter_tuning.py, no RF/HGBR tables
+    dataset_dir = tmp_path / "data" / "CA_13_county_dataset"
+    dataset_dir.mkdir(parents=True)
+    synthetic.county_month_dataset(4, 2012, 2023, 6).to_csv(
+        dataset_dir / "CA_13_counties_04_23_no_impute_daylight.csv", index=False
+    )
+    (tmp_path / "results" / "SVM").mkdir(parents=True)
+    pd.DataFrame({
+        "tuning_year": [2012, 2015], "C": [1.0, 10.0], "epsilon": [0.1, 0.2], "gamma": ["scale", "0.01"], "kernel": ["rbf", "rbf"],
+    }).to_csv(tmp_path / "results" / "SVM" / "hyperparameter_tuning_best.csv", index=False)
+
+    completed = _wnv(tmp_path, "compare", "--backtest")
+
+    assert completed.returncode == 0, completed.stderr
+    assert "Skipping RF" in completed.stdout
+    assert len(pd.read_csv(tmp_path / "data" / "SVM" / "hyperparameter_tuning_q2_rmse.csv")) == 2
+    for name in ("multi_models_q2_comparison.png", "multi_models_rmse_comparison.png"):
+        assert (tmp_path / "results" / "plots" / name).stat().st_size > 0
+    assert "7_model_backtest imports took" in completed.stderr
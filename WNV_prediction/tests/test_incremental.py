@@ -0,0 +1,54 @@
+import os
+
+import pandas as pd
+
+from wnv_incremental import rows_to_recompute, write_watermark
+from wnv_io import parquet_path, read_features, write_partitioned
+from wnv_prep import CDC_COLUMNS, base_table
+
+COUNTIES = ["alameda", "fresno", "kern"]
+
+
+def _inputs(cdc_end_year):
+    cases = pd.DataFrame({"County": ["fresno", "kern"], "Cases": [2, 1], "Year": [2020, 2021], "Month": [8, 9]})
+    locations = pd.DataFrame({
+        "County": COUNTIES, "FIPS": [6001, 6019, 6029], "Latitude": [37.6, 36.8, 35.3], "Longitude": [-121.9, -119.8, -118.7],
+    })
+    population = pd.DataFrame({"County": COUNTIES, "Population": [1_680_000, 1_010_000, 910_000]})
+    cdc = pd.DataFrame(
+        [(1, 2, 0, year, month, county) for year in range(2020, cdc_end_year + 1) for month in range(1, 13) for county in COUNTIES],
+        columns=CDC_COLUMNS,
+    )
+    return cases, locations, population, cdc
+
+
+def test_new_month_with_missing_cdc_counts_only_recomputes_new_and_lookback_rows(tmp_path):
+    # The stored output covers 2020-2021 with complete CDC counts, so they are stored as integers
+    previous = base_table(*_inputs(2021), 2020, 2021, counties=COUNTIES)
+    assert previous["Mos_WNV_Count"].dtype == "int64"
+    output_path = str(tmp_path / "output.csv")
+    write_partitioned(previous, parquet_path(output_path), ["Year"])
+    write_watermark(parquet_path(output_path), previous)
+
+    # One more month without CDC counts turns the count columns into floats after the left merge
+    current = base_table(*_inputs(2021), 2020, 2022, counties=COUNTIES)
+    current = current[(current["Year"] < 2022) | (current["Month"] == 1)].reset_index(drop=True)
+    assert current["Mos_WNV_Count"].dtype == "float64"
+
+    stored = read_features(output_path)
+    recompute = rows_to_recompute(current, stored, {"Year": 2021, "Month": 12}, lookback_months=3)
+
+    expected = (current["Year"] == 2022) | ((current["Year"] == 2021) & (current["Month"] >= 10))
+    assert recompute.tolist() == expected.tolist()
+    assert recompute.sum() == 4 * len(COUNTIES)
+    assert os.path.exists(os.path.join(parquet_path(output_path), "_watermark.json"))
+
+
+def test_changed_inputs_are_recomputed(tmp_path):
+    previous = base_table(*_inputs(2021), 2020, 2021, counties=COUNTIES)
+    current = previous.copy()
+    current.loc[(current["Year"] == 2020) & (current["Month"] == 5), "Total_Bird_WNV_Count"] = 7
+
+    recompute = rows_to_recompute(current, previous, {"Year": 2021, "Month": 12}, lookback_months=0)
+
+    assert recompute.tolist() == ((current["Year"] == 2020) & (current["Month"] == 5)).tolist()
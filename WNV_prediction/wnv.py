@@ -0,0 +1,165 @@
+"""
+Command-line entry point for the WNV pipeline.
+
+    python wnv.py [--config wnv.toml] [--workers N] [--set KEY=VALUE ...] COMMAND
+
+Each command runs one of the numbered scripts:
+    prep        1_california_wnv_analysis_prep.py, or 8_national_wnv_prep.py with --national
+    tune        6_svm_hyperparameter_tuning.py
+    bootstrap   2_bootstrap_svm_prediction.py
+    explain     3_wnv_svm_with_shap.py
+    backtest    7_model_backtest.py
+    compare     4_model_comparison_plot.py, after 7_model_backtest.py with --backtest
+    statewise   5_svm_statewise_analysis.py
+
+Only the standard library is imported until a command is chosen, and then
+only the modules its script imports, so --help and argument errors return
+at once and no command pays for another's dependencies (shap, plotly,
+xarray, ...). The time taken by the CLI itself and by the script's imports
+is reported on stderr; --imports-only stops after the imports, to measure
+the startup cost of a command.
+
+Settings reach the scripts through their WNV_* environment variables. A
+config file (TOML, or JSON for a .json path) maps keys to those variables,
+n_workers = 8 setting WNV_N_WORKERS: top-level keys apply to every
+command, and a table named after a command (e.g. [bootstrap]) applies to
+that command only. Variables already set in the environment take
+precedence over the config file, and --workers and --set over both.
+"""
+import argparse
+import ast
+import importlib
+import json
+import os
+import sys
+import time
+
+_START = time.perf_counter()
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+COMMANDS = {
+    "prep": ("1_california_wnv_analysis_prep", "build the California county-month dataset"),
+    "tune": ("6_svm_hyperparameter_tuning", "tune the SVR hyperparameters per tuning year"),
+    "bootstrap": ("2_bootstrap_svm_prediction", "bootstrap the SVR test metrics"),
+    "explain": ("3_wnv_svm_with_shap", "fit the tuned SVRs, save them and explain one with SHAP"),
+    "backtest": ("7_model_backtest", "backtest the SVM, RF and HGBR models"),
+    "compare": ("4_model_comparison_plot", "plot the SVM, RF and HGBR comparison"),
+    "statewise": ("5_svm_statewise_analysis", "fit and evaluate one SVR per state"),
+}
+NATIONAL_PREP_SCRIPT = "8_national_wnv_prep"
+
+
+def env_name(key):
+    """
+    Environment variable of a config key: n_workers -> WNV_N_WORKERS; WNV_* names are kept.
+    """
+    key = key.upper()
+    return key if key.startswith("WNV_") else f"WNV_{key}"
+
+
+def env_value(value):
+    """
+    Environment string of a config value: booleans become 1/0 and lists are joined with commas.
+    """
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (list, tuple)):
+        return ",".join(str(item) for item in value)
+    return str(value)
+
+
+def load_config(path):
+    if path.endswith(".json"):
+        with open(path) as f:
+            return json.load(f)
+    import tomllib
+
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+
+def config_env(config, command):
+    """
+    {variable: value} of the config's top-level keys, overridden by the command's table.
+    """
+    settings = {key: value for key, value in config.items() if not isinstance(value, dict)}
+    settings.update(config.get(command, {}))
+    return {env_name(key): env_value(value) for key, value in settings.items()}
+
+
+def script_imports(name):
+    """
+    Names of the modules a script imports at its top level, in order.
+    """
+    with open(os.path.join(SCRIPT_DIR, f"{name}.py")) as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def run_script(name, imports_only=False):
+    """
+    Import a script's dependencies, report how long they took, then run the script.
+    """
+    start = time.perf_counter()
+    for module in script_imports(name):
+        importlib.import_module(module)
+    print(f"wnv: {name} imports took {time.perf_counter() - start:.2f} s", file=sys.stderr)
+    if imports_only:
+        return
+
+    sys.argv = [os.path.join(SCRIPT_DIR, f"{name}.py")]
+    importlib.import_module(name).main()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="wnv", description="Run a stage of the WNV pipeline.")
+    parser.add_argument("--config", default=os.environ.get("WNV_CONFIG"), help="TOML or JSON settings file")
+    parser.add_argument("--workers", type=int, help="worker processes (WNV_N_WORKERS)")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="set a WNV_* variable, e.g. --set bootstrap_iterations=200")
+    parser.add_argument("--imports-only", action="store_true",
+                        help="import the command's dependencies, report the time and exit")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for command, (_, help_text) in COMMANDS.items():
+        subparser = commands.add_parser(command, help=help_text)
+        if command == "prep":
+            subparser.add_argument("--national", action="store_true", help="build every state, partitioned by State")
+        elif command == "compare":
+            subparser.add_argument("--backtest", action="store_true", help="run the backtest first")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    env = config_env(load_config(args.config), args.command) if args.config else {}
+    env = {name: value for name, value in env.items() if name not in os.environ}
+    if args.workers:
+        env["WNV_N_WORKERS"] = str(args.workers)
+    for setting in args.set:
+        key, _, value = setting.partition("=")
+        env[env_name(key)] = value
+    # The scripts read their settings at import, so the environment is set before any of them is loaded
+    os.environ.update(env)
+    sys.path.insert(0, SCRIPT_DIR)
+
+    scripts = [COMMANDS[args.command][0]]
+    if args.command == "prep" and args.national:
+        scripts = [NATIONAL_PREP_SCRIPT]
+    elif args.command == "compare" and args.backtest:
+        scripts = [COMMANDS["backtest"][0]] + scripts
+
+    print(f"wnv: ready in {time.perf_counter() - _START:.3f} s", file=sys.stderr)
+    for script in scripts:
+        run_script(script, args.imports_only)
+
+
+if __name__ == "__main__":
+    main()
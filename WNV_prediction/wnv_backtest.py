@@ -0,0 +1,127 @@
+"""
+Backtest of the SVM, RF and HGBR models under one CPU thread budget.
+
+Every (model family, hyperparameter set) job is fitted on the same training
+matrix and scored on the same test matrix, shared with the workers once
+through the pool initializer. SVR fits are single-threaded; RF and HGBR fit
+with their native threading (n_jobs and OpenMP), capped per job with
+threadpoolctl. The scheduler only starts a job when its threads fit into the
+remaining budget, so tree jobs and SVR workers together never use more
+threads than there are cores.
+"""
+import math
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from threadpoolctl import threadpool_limits
+
+from wnv_models import make_regressor, parse_gamma, q2_rmse
+
+FAMILIES = ("SVM", "RF", "HGBR")
+
+# Estimator parameters that are counts, read back as floats from CSV columns with empty cells
+INTEGER_PARAMS = {"n_estimators", "max_depth", "min_samples_split", "min_samples_leaf", "max_leaf_nodes",
+                  "max_iter", "max_bins", "random_state"}
+
+# Per-worker training and test data, set once by _init_worker
+_worker_state = {}
+
+
+def estimator_params(row):
+    """
+    Estimator keyword arguments from a hyperparameter table row, without tuning_year.
+
+    Empty cells become None (e.g. max_depth), the INTEGER_PARAMS become
+    ints and gamma is parsed as in the SVR tuning table.
+    """
+    params = {}
+    for name, value in row.items():
+        if name == "tuning_year":
+            continue
+        if isinstance(value, float) and math.isnan(value):
+            value = None
+        elif name in INTEGER_PARAMS:
+            value = int(value)
+        elif name == "gamma":
+            value = parse_gamma(value)
+        params[name] = value
+    return params
+
+
+def job_threads(family, tree_threads):
+    """
+    Threads a job of the family uses: one for SVR, tree_threads for the tree ensembles.
+    """
+    return 1 if family == "SVM" else tree_threads
+
+
+def make_estimator(family, params, threads=1, backend="exact", n_components=1000):
+    if family == "SVM":
+        return make_regressor(params, backend, n_components)
+    if family == "RF":
+        return RandomForestRegressor(**{"random_state": 0, **params, "n_jobs": threads})
+    if family == "HGBR":
+        return HistGradientBoostingRegressor(**{"random_state": 0, **params})
+    raise ValueError(f"Unknown model family {family!r}, expected one of {FAMILIES}")
+
+
+def _init_worker(X_train, y_train, X_test, y_test, backend, n_components):
+    _worker_state.update(
+        X_train=X_train, y_train=y_train, X_test=X_test, y_test=y_test, backend=backend, n_components=n_components
+    )
+
+
+def _run_job(family, params, threads):
+    """
+    Fit one job with at most threads BLAS/OpenMP threads and score it on the test data.
+    """
+    state = _worker_state
+    with threadpool_limits(limits=threads):
+        model = make_estimator(family, params, threads, state["backend"], state["n_components"])
+        model.fit(state["X_train"], state["y_train"])
+        predictions = model.predict(state["X_test"])
+    return q2_rmse(state["y_test"], predictions)
+
+
+def run_backtest(jobs, X_train, y_train, X_test, y_test, thread_budget=None, tree_threads=4,
+                 backend="exact", n_components=1000):
+    """
+    Fit and score (family, params) jobs within a thread budget.
+
+    jobs maps a hashable job id to (family, params); identical jobs are
+    fitted once. Jobs are started largest first while their threads fit into
+    thread_budget (default: all cores). Returns {job id: (q2, rmse)}.
+    """
+    thread_budget = thread_budget or os.cpu_count()
+    tree_threads = max(1, min(tree_threads, thread_budget))
+
+    # Fit identical (family, params) jobs once
+    unique = {}
+    for job_id, (family, params) in jobs.items():
+        unique.setdefault((family, tuple(sorted(params.items()))), []).append(job_id)
+    pending = sorted(unique, key=lambda job: job_threads(job[0], tree_threads), reverse=True)
+
+    results = {}
+    running = {}
+    free_threads = thread_budget
+    with ProcessPoolExecutor(
+        max_workers=max(1, min(thread_budget, len(pending))),
+        initializer=_init_worker,
+        initargs=(X_train, y_train, X_test, y_test, backend, n_components),
+    ) as executor:
+        while pending or running:
+            # Start every pending job whose threads fit, keeping the order (largest first)
+            for job in list(pending):
+                threads = job_threads(job[0], tree_threads)
+                if threads <= free_threads:
+                    pending.remove(job)
+                    running[executor.submit(_run_job, job[0], dict(job[1]), threads)] = (job, threads)
+                    free_threads -= threads
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                job, threads = running.pop(future)
+                free_threads += threads
+                for job_id in unique[job]:
+                    results[job_id] = future.result()
+    return results
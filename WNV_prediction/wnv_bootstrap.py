@@ -0,0 +1,179 @@
+"""
+Parallel bootstrap engine for the WNV SVR models.
+
+Each bootstrap iteration is identified only by its number: the resample is
+drawn lazily as row indices from a seed derived from (seed, iteration), so no
+resampled copies of the training data are ever materialized and peak memory
+stays flat no matter how many iterations are requested. The fits are spread
+across a process pool whose workers receive the design matrices once.
+
+In precomputed kernel mode the training data is standardized once, the
+train/train and test/train kernel matrices are computed once in the parent and
+shared with the workers as memory-mapped files, and every replicate is fitted
+on a row/column gather of them with SVR(kernel="precomputed").
+"""
+import os
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+from sklearn.svm import SVR
+
+from wnv_design import ReplicateBuilder, weighted_mean_std
+from wnv_models import check_kernel_mode, kernel_matrix, make_regressor, q2_rmse, resolve_gamma
+
+# Per-worker state, set once by _init_worker so each task only ships an iteration number
+_worker_state = {}
+
+
+def bootstrap_indices(n_rows, seed, iteration):
+    """
+    Draw the row indices of one bootstrap resample (with replacement).
+
+    The generator is seeded from (seed, iteration), so any iteration can be
+    reproduced on its own, independently of worker count or completion order.
+    """
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(iteration,)))
+    return rng.integers(0, n_rows, size=n_rows)
+
+
+def _init_worker(X_train, y_train, X_test, y_test, model_params, seed, backend, n_components):
+    _worker_state.update(
+        builder=ReplicateBuilder(X_train, y_train, X_test),
+        y_test=y_test,
+        model_params=model_params,
+        seed=seed,
+        backend=backend,
+        n_components=n_components,
+    )
+
+
+def _fit_iteration(iteration):
+    """
+    Fit one SVR on a bootstrap resample of the training data and score it on the test data.
+    """
+    state = _worker_state
+    builder = state["builder"]
+    indices = bootstrap_indices(len(builder.X_train), state["seed"], iteration)
+    x_train, y_train, x_test = builder.build(indices)
+
+    model = make_regressor(state["model_params"], state["backend"], state["n_components"])
+    fit_start = time.perf_counter()
+    model.fit(x_train, y_train)
+    predict_start = time.perf_counter()
+    predictions = model.predict(x_test)
+    predict_end = time.perf_counter()
+
+    q2, rmse = q2_rmse(state["y_test"], predictions)
+    return iteration, q2, rmse, predict_start - fit_start, predict_end - predict_start
+
+
+def _init_precomputed_worker(train_gram_path, test_gram_path, y_train, y_test, model_params, seed):
+    train_gram = np.load(train_gram_path, mmap_mode="r")
+    test_gram = np.load(test_gram_path, mmap_mode="r")
+    n_train = len(train_gram)
+    _worker_state.update(
+        train_gram=train_gram,
+        test_gram=test_gram,
+        y_train=y_train,
+        y_test=y_test,
+        model_params=model_params,
+        seed=seed,
+        # Reused gather buffers
+        rows=np.empty_like(train_gram),
+        replicate_gram=np.empty_like(train_gram),
+        replicate_test_gram=np.empty((len(test_gram), n_train)),
+    )
+
+
+def _fit_iteration_precomputed(iteration):
+    """
+    Fit one SVR on the kernel matrix gathered for a bootstrap resample and score it on the test data.
+    """
+    state = _worker_state
+    indices = bootstrap_indices(len(state["train_gram"]), state["seed"], iteration)
+    np.take(state["train_gram"], indices, axis=0, out=state["rows"], mode="clip")
+    np.take(state["rows"], indices, axis=1, out=state["replicate_gram"], mode="clip")
+    np.take(state["test_gram"], indices, axis=1, out=state["replicate_test_gram"], mode="clip")
+
+    params = state["model_params"]
+    model = SVR(kernel="precomputed", C=params["C"], epsilon=params["epsilon"])
+    fit_start = time.perf_counter()
+    model.fit(state["replicate_gram"], state["y_train"][indices])
+    predict_start = time.perf_counter()
+    predictions = model.predict(state["replicate_test_gram"])
+    predict_end = time.perf_counter()
+
+    q2, rmse = q2_rmse(state["y_test"], predictions)
+    return iteration, q2, rmse, predict_start - fit_start, predict_end - predict_start
+
+
+def _write_grams(directory, X_train, X_test, model_params):
+    """
+    Standardize on the full training data, then save the train/train and test/train kernel matrices.
+    """
+    mean, std = weighted_mean_std(X_train, np.ones(len(X_train)))
+    X_train = (X_train - mean) / std
+    X_test = (X_test - mean) / std
+
+    kernel = model_params.get("kernel", "rbf")
+    gamma = resolve_gamma(model_params.get("gamma", "scale"), X_train)
+    degree = model_params.get("degree", 3)
+    coef0 = model_params.get("coef0", 0.0)
+    paths = os.path.join(directory, "train_gram.npy"), os.path.join(directory, "test_gram.npy")
+    np.save(paths[0], kernel_matrix(X_train, X_train, kernel, gamma, degree, coef0))
+    np.save(paths[1], kernel_matrix(X_test, X_train, kernel, gamma, degree, coef0))
+    return paths
+
+
+def run_bootstrap(X_train, y_train, X_test, y_test, model_params, n_iterations=1000, n_workers=None, seed=0,
+                  kernel_mode="exact", backend="exact", n_components=1000, timings=False):
+    """
+    Run the bootstrap fits in a process pool and yield (iteration, q2, rmse) as they finish.
+
+    With timings, each tuple also holds the fit and predict seconds of the
+    iteration, measured in its worker.
+
+    X_train/X_test are the unscaled design matrices from wnv_design. With
+    kernel_mode="exact" each replicate is standardized on its own resample.
+    With kernel_mode="precomputed" the data is standardized once on the full
+    training set, so the kernel matrices can be computed once and gathered per
+    replicate; results differ slightly from exact mode through the scaling.
+    backend selects the regressor in exact kernel mode (see
+    wnv_models.make_regressor). Only a bounded number of iterations are in flight at any time, so memory
+    does not grow with n_iterations. Results arrive in completion order; use
+    the iteration number to place them.
+    """
+    check_kernel_mode(kernel_mode, backend)
+
+    with tempfile.TemporaryDirectory(prefix="wnv_gram_") as gram_dir:
+        if kernel_mode == "precomputed":
+            gram_paths = _write_grams(gram_dir, X_train, X_test, model_params)
+            initializer = _init_precomputed_worker
+            initargs = (*gram_paths, y_train, y_test, model_params, seed)
+            fit_iteration = _fit_iteration_precomputed
+        else:
+            initializer = _init_worker
+            initargs = (X_train, y_train, X_test, y_test, model_params, seed, backend, n_components)
+            fit_iteration = _fit_iteration
+
+        n_workers = n_workers or os.cpu_count()
+        max_in_flight = 2 * n_workers
+        iterations = iter(range(n_iterations))
+
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=initializer, initargs=initargs) as executor:
+            pending = set()
+            for iteration in iterations:
+                pending.add(executor.submit(fit_iteration, iteration))
+                if len(pending) >= max_in_flight:
+                    break
+
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    yield result if timings else result[:3]
+                    iteration = next(iterations, None)
+                    if iteration is not None:
+                        pending.add(executor.submit(fit_iteration, iteration))
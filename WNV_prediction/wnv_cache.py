@@ -0,0 +1,128 @@
+"""
+On-disk cache for the raster and NetCDF feature lookups.
+
+Values live in a local SQLite database, keyed by a fingerprint of the source
+file plus the lookup coordinates (and variable, lag and month for climate
+values), so later runs over the same counties skip the raster and NetCDF I/O
+entirely. The cache holds at most max_entries values and evicts the least
+recently used ones first.
+
+The fingerprint is the sha256 of the whole source file. It is stored in the
+same database under the file's path, size, mtime and inode, so unchanged
+files are recognized from their stat alone in later runs and other workers,
+and a file is only read in full again after it has been rewritten.
+"""
+import functools
+import hashlib
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+# SQLite limits the number of host parameters per statement
+_BATCH_SIZE = 500
+
+
+def file_fingerprint(path):
+    """
+    Content fingerprint of a source file: the sha256 of the whole file.
+
+    Hashing a multi-gigabyte raster or NetCDF cube takes seconds, so the
+    digest is memoized per process on the file's stat key (see
+    FeatureCache.fingerprint to keep it across runs); a rewritten file
+    changes its size, mtime or inode and is hashed again. Hashing only samples
+    of the file would be cheaper, but an in-place rewrite that keeps the size
+    and changes the middle would then keep serving stale cached features.
+    """
+    return _file_digest(*_stat_key(path))
+
+
+def _stat_key(path):
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+@functools.lru_cache(maxsize=None)
+def _file_digest(path, size, mtime_ns, inode):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 24), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class FeatureCache:
+    """
+    Size-bounded key -> float store backed by SQLite.
+
+    NaN values are stored as NULL and returned as NaN, so a cached missing
+    value is still a hit.
+    """
+
+    def __init__(self, path, max_entries=5_000_000):
+        self.max_entries = max_entries
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS features (key TEXT PRIMARY KEY, value REAL, accessed REAL) WITHOUT ROWID"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS features_accessed ON features (accessed)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS fingerprints "
+            "(path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inode INTEGER, digest TEXT)"
+        )
+        self.conn.commit()
+
+    def fingerprint(self, path):
+        """
+        file_fingerprint of path, stored under its stat key so unchanged files are not read again.
+        """
+        key = _stat_key(path)
+        row = self.conn.execute(
+            "SELECT digest FROM fingerprints WHERE path = ? AND size = ? AND mtime_ns = ? AND inode = ?", key
+        ).fetchone()
+        if row is not None:
+            return row[0]
+        digest = _file_digest(*key)
+        self.conn.execute("INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?)", (*key, digest))
+        self.conn.commit()
+        return digest
+
+    def get_many(self, keys):
+        """
+        Return {key: value} for the keys found in the cache and mark them as recently used.
+        """
+        found = {}
+        now = time.time()
+        keys = list(keys)
+        for start in range(0, len(keys), _BATCH_SIZE):
+            batch = keys[start:start + _BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            rows = self.conn.execute(
+                f"SELECT key, value FROM features WHERE key IN ({placeholders})", batch
+            ).fetchall()
+            found.update((key, np.nan if value is None else value) for key, value in rows)
+            self.conn.execute(f"UPDATE features SET accessed = ? WHERE key IN ({placeholders})", [now, *batch])
+        self.conn.commit()
+        return found
+
+    def put_many(self, items):
+        """
+        Store (key, value) pairs, then evict the least recently used entries beyond max_entries.
+        """
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO features (key, value, accessed) VALUES (?, ?, ?)",
+            ((key, None if np.isnan(value) else float(value), now) for key, value in items),
+        )
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM features").fetchone()
+        if count > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM features WHERE key IN (SELECT key FROM features ORDER BY accessed LIMIT ?)",
+                (count - self.max_entries,),
+            )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
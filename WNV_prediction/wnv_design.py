@@ -0,0 +1,84 @@
+"""
+Design-matrix stage for the WNV models.
+
+The feature/label arrays are built once as contiguous float64 NumPy arrays, and
+each bootstrap replicate is standardized from its resample counts (a weighted
+mean/std over the original rows) instead of refitting a StandardScaler on a
+resampled DataFrame copy.
+"""
+import numpy as np
+
+
+def drop_uninformative_columns(data):
+    """
+    Drop the columns that are all NaN or constant.
+
+    Scripts that use only some years must call this on the full table before
+    filtering by year, so they keep the same columns, and the same
+    gamma="auto", as 3_wnv_svm_with_shap.py.
+    """
+    data = data.dropna(axis=1, how="all")
+    return data.loc[:, data.var() != 0]
+
+
+def build_design_matrix(data, target_column, drop_columns=()):
+    """
+    Split a DataFrame into contiguous float64 arrays.
+
+    Returns (X, y, feature_names), where X holds every column except the
+    target and drop_columns, in their original order.
+    """
+    features = data.drop(columns=[target_column, *drop_columns])
+    X = np.ascontiguousarray(features.to_numpy(dtype=np.float64))
+    y = np.ascontiguousarray(data[target_column].to_numpy(dtype=np.float64))
+    return X, y, list(features.columns)
+
+
+def weighted_mean_std(X, counts, out=None):
+    """
+    Column mean and standard deviation of X with each row weighted by counts.
+
+    This equals what StandardScaler learns on X.repeat(counts, axis=0): the
+    population standard deviation, with constant columns given a scale of 1.
+    out, if given, is an X-shaped scratch buffer for the centered values.
+    """
+    n = counts.sum()
+    mean = counts @ X / n
+    centered = np.subtract(X, mean, out=out)
+    np.square(centered, out=centered)
+    std = np.sqrt(counts @ centered / n)
+    std[std < 10 * np.finfo(np.float64).eps] = 1.0
+    return mean, std
+
+
+class ReplicateBuilder:
+    """
+    Builds the scaled train/test arrays of bootstrap replicates into reused buffers.
+
+    The arrays returned by build() are overwritten by the next call, so a
+    replicate must be consumed (fitted and scored) before the next one is built.
+    """
+
+    def __init__(self, X_train, y_train, X_test):
+        self.X_train = X_train
+        self.y_train = y_train
+        self.X_test = X_test
+        self._centered = np.empty_like(X_train)
+        self._train = np.empty_like(X_train)
+        self._test = np.empty_like(X_test)
+
+    def build(self, indices):
+        """
+        Return (x_train, y_train, x_test) for the resample given by row indices.
+        """
+        counts = np.bincount(indices, minlength=len(self.X_train)).astype(np.float64)
+        mean, std = weighted_mean_std(self.X_train, counts, out=self._centered)
+
+        np.take(self.X_train, indices, axis=0, out=self._train, mode="clip")
+        self._train -= mean
+        self._train /= std
+
+        np.subtract(self.X_test, mean, out=self._test)
+        self._test /= std
+
+        return self._train, self.y_train[indices], self._test
@@ -0,0 +1,188 @@
+"""
+Feature enrichment steps for the WNV county-month dataset.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import rasterio
+import xarray as xr
+from rasterio.windows import Window
+
+MONTH_NAMES = [
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December"
+]
+LAND_USE_TYPES = [
+    "Evergreen/Deciduous Needleleaf Trees", "Evergreen Broadleaf Trees", "Deciduous Broadleaf Trees",
+    "Mixed Trees", "Shrub", "Herbaceous", "Culture/Managed", "Wetland", "Urban/Built",
+    "Snow/Ice", "Barren", "Water"
+]
+CLIMATE_VARIABLES = ["u10", "v10", "t2m", "lai_hv", "lai_lv", "src", "sf", "sro", "tp"]
+
+
+def add_oni(data, df_enso):
+    """
+    Add the Oceanic Nino Index (ONI) for each row's Year and Month.
+
+    The ENSO table (one row per year, one column per month name) is melted once
+    into a (Year, Month) -> ONI lookup and joined with a single merge. Raises
+    ValueError if the table has no row for some of the years in data.
+    """
+    enso = df_enso.drop_duplicates("Year")[["Year", *MONTH_NAMES]]
+
+    missing_years = sorted(int(year) for year in set(data["Year"].unique()) - set(enso["Year"]))
+    if missing_years:
+        raise ValueError(f"ENSO table has no ONI values for years: {missing_years}")
+
+    oni = enso.melt(id_vars="Year", value_vars=MONTH_NAMES, var_name="Month", value_name="ONI")
+    oni["Month"] = oni["Month"].map({name: i for i, name in enumerate(MONTH_NAMES, start=1)})
+    return data.merge(oni, how="left", on=["Year", "Month"], validate="many_to_one")
+
+
+def land_cover_pixel_indices(latitude, longitude, height, width):
+    """
+    Nearest pixel (row, col) of each point on the global land-cover grid.
+
+    Uses the same georeferencing as before: pixel rows are spaced as
+    np.linspace(90, -56, height) in latitude and columns as
+    np.linspace(-180, 180, width) in longitude.
+    """
+    rows = np.rint((90 - np.asarray(latitude, dtype=float)) / (90 + 56) * (height - 1)).astype(int)
+    cols = np.rint((np.asarray(longitude, dtype=float) + 180) / 360 * (width - 1)).astype(int)
+    return np.clip(rows, 0, height - 1), np.clip(cols, 0, width - 1)
+
+
+def sample_land_cover(points, land_use_dir, cache=None):
+    """
+    Sample the 12 consensus land-cover rasters at each unique point location.
+
+    points is a DataFrame with Latitude/Longitude columns; each location is
+    sampled once, however many rows share it. The GeoTIFFs are opened lazily
+    and only the pixels under the points are read, through 1x1 windows, so no
+    global raster is ever loaded into memory. Band 1 holds the same values
+    cv2.imread(...)[:, :, 0] returned for these single-band 8-bit rasters.
+    With a FeatureCache, cached locations skip the raster entirely.
+
+    Returns a DataFrame with Latitude, Longitude and one column per land use type.
+    """
+    locations = points[["Latitude", "Longitude"]].dropna().drop_duplicates().reset_index(drop=True)
+    samples = locations.copy()
+    for i, land_use in enumerate(LAND_USE_TYPES, start=1):
+        raster_path = os.path.join(land_use_dir, f"consensus_full_class_{i}.tif")
+        values = np.full(len(locations), np.nan)
+        missing = np.ones(len(locations), dtype=bool)
+
+        if cache is not None:
+            fingerprint = cache.fingerprint(raster_path)
+            keys = [f"{fingerprint}|{lat!r}|{lon!r}" for lat, lon in zip(locations["Latitude"], locations["Longitude"])]
+            cached = cache.get_many(keys)
+            for j, key in enumerate(keys):
+                if key in cached:
+                    values[j] = cached[key]
+                    missing[j] = False
+
+        # Opening the raster reads only its header, which also gives the dtype of the sampled values
+        with rasterio.open(raster_path) as src:
+            dtype = src.dtypes[0]
+            if missing.any():
+                rows, cols = land_cover_pixel_indices(
+                    locations["Latitude"][missing], locations["Longitude"][missing], src.height, src.width
+                )
+                values[missing] = [src.read(1, window=Window(col, row, 1, 1))[0, 0] for row, col in zip(rows, cols)]
+        if cache is not None and missing.any():
+            cache.put_many((keys[j], values[j]) for j in np.flatnonzero(missing))
+
+        # values is float to hold cached NaNs; without any, the column keeps the raster's dtype
+        samples[land_use] = values if np.isnan(values).any() else values.astype(dtype)
+    return samples
+
+
+def _read_climate(climate_path, latitude, longitude, dates, variables, lags, time_chunk):
+    """
+    Lagged climate values for each (latitude, longitude, date) lookup, as {column name: array}.
+    """
+    point_codes, points = pd.factorize(pd.MultiIndex.from_arrays([latitude, longitude]))
+    date_codes, unique_dates = pd.factorize(pd.DatetimeIndex(dates))
+
+    with xr.open_dataset(climate_path, chunks={"time": time_chunk}) as climate_ds:
+        climate_ds = climate_ds[variables].sortby("time")
+        if "expver" in climate_ds.dims:
+            climate_ds = climate_ds.sel(expver=1, method="nearest")
+
+        lat_idx = climate_ds.indexes["latitude"].get_indexer(points.get_level_values(0), method="nearest")
+        lon_idx = climate_ds.indexes["longitude"].get_indexer(points.get_level_values(1), method="nearest")
+        time_idx = climate_ds.indexes["time"].get_indexer(unique_dates, method="nearest")
+
+        # Time steps each unique month needs for each lag; -1 marks "before the cube"
+        lagged_idx = {lag: np.where(time_idx - lag >= 0, time_idx - lag, -1) for lag in lags}
+        needed_times = np.unique(np.concatenate([idx[idx >= 0] for idx in lagged_idx.values()]))
+
+        grid = climate_ds.isel(
+            time=needed_times,
+            latitude=xr.DataArray(lat_idx, dims="point"),
+            longitude=xr.DataArray(lon_idx, dims="point"),
+        ).compute()
+
+    columns = {}
+    for lag, idx in lagged_idx.items():
+        lookup_times = idx[date_codes]
+        valid = lookup_times >= 0
+        time_pos = np.searchsorted(needed_times, lookup_times[valid])
+        for var in variables:
+            values = grid[var].transpose("time", "point").values
+            column = np.full(len(date_codes), np.nan)
+            column[valid] = values[time_pos, point_codes[valid]]
+            columns[f"{var}_{lag}m_shift"] = column
+    return columns
+
+
+def extract_climate(data, climate_path, variables=CLIMATE_VARIABLES, lags=(1,), time_chunk=12, cache=None):
+    """
+    Add lagged monthly climate variables at each row's location and month.
+
+    One "{var}_{lag}m_shift" column is added per variable and lag, holding the
+    value at the nearest grid point `lag` time steps before the time step
+    nearest to the row's Year/Month (NaN before the start of the cube), as the
+    earlier shift(time=1) selection did.
+
+    The NetCDF file is opened with dask chunks and every variable is read in
+    one pass, for the unique (county point, month) lookups only; the results
+    are then broadcast back to the rows. With a FeatureCache, only lookups
+    missing from the cache touch the NetCDF file.
+    """
+    if data[["Latitude", "Longitude"]].isna().any().any():
+        raise ValueError("Climate extraction needs Latitude/Longitude for every row")
+
+    dates = pd.to_datetime(data[["Year", "Month"]].assign(day=1))
+    row_codes, lookups = pd.factorize(
+        pd.MultiIndex.from_arrays([data["Latitude"].to_numpy(), data["Longitude"].to_numpy(), dates.to_numpy()])
+    )
+    latitude, longitude, lookup_dates = (lookups.get_level_values(level) for level in range(3))
+    names = [f"{var}_{lag}m_shift" for lag in lags for var in variables]
+
+    if cache is None:
+        values = _read_climate(climate_path, latitude, longitude, lookup_dates, variables, lags, time_chunk)
+    else:
+        fingerprint = cache.fingerprint(climate_path)
+        keys = {
+            name: [f"{fingerprint}|{name}|{lat!r}|{lon!r}|{date:%Y-%m}" for lat, lon, date in zip(latitude, longitude, lookup_dates)]
+            for name in names
+        }
+        cached = cache.get_many(key for name in names for key in keys[name])
+        values = {name: np.array([cached.get(key, np.nan) for key in keys[name]]) for name in names}
+        missing = np.zeros(len(lookups), dtype=bool)
+        for name in names:
+            missing |= np.array([key not in cached for key in keys[name]])
+
+        if missing.any():
+            fresh = _read_climate(
+                climate_path, latitude[missing], longitude[missing], lookup_dates[missing], variables, lags, time_chunk
+            )
+            for name in names:
+                values[name][missing] = fresh[name]
+            cache.put_many(
+                (keys[name][j], values[name][j]) for name in names for j in np.flatnonzero(missing)
+            )
+
+    return data.assign(**{name: values[name][row_codes] for name in names})
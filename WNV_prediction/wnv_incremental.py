@@ -0,0 +1,102 @@
+"""
+Incremental refresh of the prep output.
+
+The stored Parquet dataset carries a watermark: the latest (Year, Month) it
+holds. A refresh recomputes the expensive features only for keys that are new,
+whose input columns changed, or that fall within a look-back window behind the
+watermark (recent ONI and climate values are revised after first release).
+The results are upserted by rewriting only the affected Year partitions.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+from wnv_io import normalize_dtypes, write_partitioned
+
+KEY_COLUMNS = ["Year", "Month", "County"]
+WATERMARK_FILE = "_watermark.json"
+
+
+def read_watermark(dataset_path):
+    """
+    Return the stored watermark as a dict with Year and Month, or None if there is none.
+    """
+    path = os.path.join(dataset_path, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_watermark(dataset_path, data):
+    """
+    Record the latest (Year, Month) in data as the dataset's watermark.
+    """
+    latest = data[["Year", "Month"]].drop_duplicates().sort_values(["Year", "Month"]).iloc[-1]
+    with open(os.path.join(dataset_path, WATERMARK_FILE), "w") as f:
+        json.dump({"Year": int(latest["Year"]), "Month": int(latest["Month"])}, f)
+
+
+def _canonical(data):
+    """
+    Dtype-independent copy of data: numbers as float64 and other values as objects, missing ones as None.
+
+    A left merge with missing rows turns int64 counts into float64, which
+    must not make the unchanged rows hash differently.
+    """
+    canonical = {}
+    for col in data.columns:
+        if is_numeric_dtype(data[col]):
+            canonical[col] = data[col].to_numpy(dtype="float64", na_value=np.nan)
+        else:
+            canonical[col] = data[col].astype(object).where(data[col].notna(), None)
+    return pd.DataFrame(canonical, index=data.index)
+
+
+def _row_hashes(data, columns):
+    return pd.util.hash_pandas_object(_canonical(data[columns]), index=False).values
+
+
+def rows_to_recompute(base, previous, watermark, lookback_months=3):
+    """
+    Boolean mask over the rows of base whose features must be (re)computed.
+
+    base holds the key and input columns before feature extraction; previous
+    is the stored output. A row is selected when its key is not stored yet,
+    when any of its input columns differ from the stored row, or when it lies
+    within lookback_months of the watermark.
+    """
+    input_columns = [col for col in base.columns if col not in KEY_COLUMNS]
+    keys = normalize_dtypes(base[KEY_COLUMNS])
+    current = keys.assign(_hash=_row_hashes(base, input_columns))
+    stored = normalize_dtypes(previous[KEY_COLUMNS]).assign(_hash=_row_hashes(previous, input_columns))
+    merged = current.merge(stored, how="left", on=KEY_COLUMNS + ["_hash"], indicator=True)
+    changed = (merged["_merge"] == "left_only").to_numpy()
+
+    month_index = base["Year"].to_numpy() * 12 + base["Month"].to_numpy() - 1
+    watermark_index = watermark["Year"] * 12 + watermark["Month"] - 1
+    recent = month_index > watermark_index - lookback_months
+    return changed | recent
+
+
+def upsert(dataset_path, previous, updated, keys):
+    """
+    Replace or insert the rows of updated into the stored dataset.
+
+    Only the Year partitions that updated touches are rewritten. Returns the
+    combined dataset with one row per key in keys, in the order of keys.
+    """
+    stored_keys = normalize_dtypes(previous[KEY_COLUMNS])
+    replaced = stored_keys.merge(normalize_dtypes(updated[KEY_COLUMNS]), how="left", on=KEY_COLUMNS, indicator=True)
+    kept = previous[(replaced["_merge"] == "left_only").to_numpy()]
+
+    combined = normalize_dtypes(pd.concat([kept, updated], ignore_index=True))
+    combined = normalize_dtypes(keys).merge(combined, how="left", on=KEY_COLUMNS)
+
+    affected_years = updated["Year"].unique()
+    write_partitioned(combined[combined["Year"].isin(affected_years)], dataset_path, ["Year"])
+    write_watermark(dataset_path, combined)
+    return combined
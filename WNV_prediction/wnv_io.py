@@ -0,0 +1,143 @@
+"""
+Columnar storage for the WNV datasets.
+
+Datasets are stored as Hive-partitioned Parquet directories next to their CSV
+files (data.csv -> data.parquet/Year=2004/...). Readers ask for the columns and
+years/states they need and only those are loaded; files without a Parquet copy
+fall back to the CSV.
+
+Run as a script to convert an existing CSV:
+    python wnv_io.py data.csv --partition-by State --index-col 0
+"""
+import argparse
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Column types that should survive the round trip instead of being re-inferred on every load
+COLUMN_DTYPES = {"Year": "int16", "Month": "int8", "FIPS": "Int32", "County": "string", "State": "string"}
+
+# Sidecar holding the original column order; partition columns otherwise come back last
+COLUMN_ORDER_FILE = "_columns.json"
+
+
+def parquet_path(csv_path):
+    """
+    Path of the Parquet dataset that stands next to a CSV file.
+    """
+    return os.path.splitext(csv_path)[0] + ".parquet"
+
+
+def normalize_dtypes(data):
+    """
+    Cast the columns listed in COLUMN_DTYPES to their stored types.
+    """
+    return data.astype({col: dtype for col, dtype in COLUMN_DTYPES.items() if col in data.columns})
+
+
+def write_partitioned(data, path, partition_cols=("Year",), basename_template=None,
+                      existing_data_behavior="delete_matching"):
+    """
+    Write a DataFrame as a typed Parquet dataset partitioned by partition_cols.
+
+    Partitions present in data replace the stored ones; other partitions are
+    kept. With existing_data_behavior="overwrite_or_ignore" and a distinct
+    basename_template per writer, several writers can add files to the same
+    partitions instead.
+    """
+    data = normalize_dtypes(data)
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    pq.write_to_dataset(
+        table, path, partition_cols=list(partition_cols), basename_template=basename_template,
+        existing_data_behavior=existing_data_behavior,
+    )
+    # Concurrent writers each replace the sidecar atomically
+    order_path = os.path.join(path, COLUMN_ORDER_FILE)
+    tmp_path = f"{order_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(list(data.columns), f)
+    os.replace(tmp_path, order_path)
+
+
+def ensure_parquet(csv_path, partition_cols, index_col=None):
+    """
+    Convert csv_path to its Parquet dataset unless an up-to-date copy exists.
+    """
+    path = parquet_path(csv_path)
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(csv_path):
+        return path
+    print(f"Converting {csv_path} to Parquet...")
+    write_partitioned(pd.read_csv(csv_path, index_col=index_col), path, partition_cols)
+    return path
+
+
+def _row_filter(min_year, max_year, states):
+    conditions = []
+    if min_year is not None:
+        conditions.append(ds.field("Year") >= min_year)
+    if max_year is not None:
+        conditions.append(ds.field("Year") <= max_year)
+    if states is not None:
+        conditions.append(ds.field("State").isin(list(states)))
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def read_features(csv_path, columns=None, exclude=(), min_year=None, max_year=None, states=None, index_col=None):
+    """
+    Load a dataset, reading only the requested columns, years and states.
+
+    Reads the Parquet dataset next to csv_path when it exists, pushing the
+    column projection and the Year/State filters down to the scan; otherwise
+    reads the CSV and applies them in pandas. columns selects columns, exclude
+    drops columns (missing ones are ignored), min_year/max_year bound Year
+    (inclusive) and states keeps only the given State values. Columns keep
+    their original order.
+    """
+    path = parquet_path(csv_path)
+    if os.path.exists(path):
+        dataset = ds.dataset(path, format="parquet", partitioning="hive")
+        order_path = os.path.join(path, COLUMN_ORDER_FILE)
+        if os.path.exists(order_path):
+            with open(order_path) as f:
+                all_columns = json.load(f)
+        else:
+            all_columns = dataset.schema.names
+        names = [col for col in (columns or all_columns) if col not in exclude]
+        data = dataset.to_table(columns=names, filter=_row_filter(min_year, max_year, states)).to_pandas()
+        data = data[names]
+    else:
+        data = pd.read_csv(csv_path, index_col=index_col)
+        if min_year is not None:
+            data = data[data["Year"] >= min_year]
+        if max_year is not None:
+            data = data[data["Year"] <= max_year]
+        if states is not None:
+            data = data[data["State"].isin(list(states))]
+        names = [col for col in (columns or data.columns) if col not in exclude]
+        data = data[names]
+
+    return normalize_dtypes(data).reset_index(drop=True)
+
+
+def partition_values(csv_path, column):
+    """
+    Sorted distinct values of a partition column (e.g. State) of the Parquet dataset next to csv_path.
+    """
+    dataset = ds.dataset(parquet_path(csv_path), format="parquet", partitioning="hive")
+    return sorted(dataset.to_table(columns=[column]).column(column).unique().to_pylist())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a CSV file to a partitioned Parquet dataset.")
+    parser.add_argument("csv_path")
+    parser.add_argument("--partition-by", nargs="+", default=["Year"])
+    parser.add_argument("--index-col", type=int, default=None)
+    args = parser.parse_args()
+    print(ensure_parquet(args.csv_path, args.partition_by, index_col=args.index_col))
@@ -0,0 +1,350 @@
+"""
+Shared model layer for the WNV SVR scripts.
+
+Hyperparameter sets are identified by a config key (C, epsilon, gamma, kernel),
+so identical rows of a tuning table are fitted only once, and the distinct
+configs are fitted concurrently in a process pool.
+
+Repeated fits on the same standardized feature matrix can share its kernel
+(Gram) matrix: KernelCache computes each train/train and test/train matrix
+once per (dataset, kernel, gamma, degree, coef0) under an LRU memory bound,
+and KernelSVR fits SVR(kernel="precomputed") on row/column gathers of it.
+
+For training sets too large for exact SVR, make_regressor offers approximate
+backends with the same fit/predict interface: a Nystroem or random Fourier
+feature map followed by a linear SVR, or a linear SVR on the features alone.
+compare_backends measures their accuracy and speed against exact SVR.
+"""
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from sklearn import metrics
+from sklearn.kernel_approximation import Nystroem, RBFSampler
+from sklearn.metrics.pairwise import pairwise_kernels
+from sklearn.svm import SVR, LinearSVR
+
+# Regressor backends: exact kernel SVR, kernel approximations with a linear solver, or linear SVR
+BACKENDS = ("exact", "nystroem", "rff", "linear")
+# Kernel evaluation: on the features, or gathered from a cached (precomputed) kernel matrix
+KERNEL_MODES = ("exact", "precomputed")
+
+# Per-worker training data, set once by _init_worker
+_worker_state = {}
+
+
+def parse_gamma(gamma):
+    """
+    SVR gamma from a tuning table cell: "scale"/"auto" stay strings, numbers become floats.
+    """
+    try:
+        return float(gamma)
+    except ValueError:
+        return gamma
+
+
+def config_key(row):
+    """
+    Hashable (C, epsilon, gamma, kernel) key of a hyperparameter row.
+    """
+    return float(row["C"]), float(row["epsilon"]), parse_gamma(row["gamma"]), row["kernel"]
+
+
+def svr_params(key):
+    """
+    SVR keyword arguments of a config key.
+    """
+    C, epsilon, gamma, kernel = key
+    return dict(C=C, epsilon=epsilon, gamma=gamma, kernel=kernel)
+
+
+def q2_rmse(y_true, predictions):
+    """
+    (Q2, RMSE) of predictions on held-out targets, the scores every backtest and bootstrap reports.
+    """
+    return metrics.r2_score(y_true, predictions), np.sqrt(metrics.mean_squared_error(y_true, predictions))
+
+
+def resolve_gamma(gamma, X):
+    """
+    Numeric kernel coefficient SVR would use for gamma when fitted on X.
+    """
+    if gamma == "scale":
+        variance = X.var()
+        return 1.0 / (X.shape[1] * variance) if variance != 0 else 1.0
+    if gamma == "auto":
+        return 1.0 / X.shape[1]
+    return float(gamma)
+
+
+def kernel_matrix(X, Y, kernel, gamma, degree=3, coef0=0.0):
+    """
+    Kernel matrix between the rows of X and Y, with SVR's parameter conventions.
+    """
+    return pairwise_kernels(X, Y, metric=kernel, filter_params=True, gamma=gamma, degree=degree, coef0=coef0)
+
+
+class KernelCache:
+    """
+    LRU cache of kernel matrices, bounded by their total size in bytes.
+
+    Entries are keyed by a caller-chosen dataset name (e.g. "train" or
+    "test") and the kernel parameters, so the caller must use a new name when
+    the underlying feature matrix changes.
+    """
+
+    def __init__(self, max_bytes=1 << 30):
+        self.max_bytes = max_bytes
+        self._matrices = OrderedDict()
+        self._nbytes = 0
+
+    def get(self, name, X, Y, kernel, gamma, degree=3, coef0=0.0):
+        key = (name, kernel, gamma, degree, coef0)
+        if key in self._matrices:
+            self._matrices.move_to_end(key)
+            return self._matrices[key]
+
+        K = kernel_matrix(X, Y, kernel, gamma, degree, coef0)
+        self._matrices[key] = K
+        self._nbytes += K.nbytes
+        while self._nbytes > self.max_bytes and len(self._matrices) > 1:
+            _, evicted = self._matrices.popitem(last=False)
+            self._nbytes -= evicted.nbytes
+        return K
+
+
+class KernelSVR:
+    """
+    SVR fitted with kernel="precomputed" on a gathered Gram matrix.
+
+    fit_gram/predict_gram work on kernel matrices; predict works on feature
+    rows, evaluating the kernel against the stored support vectors only, so a
+    fitted model can be used wherever an SVR could (SHAP, serving).
+    """
+
+    def __init__(self, C=1.0, epsilon=0.1, kernel="rbf", gamma=1.0, degree=3, coef0=0.0):
+        self.C = C
+        self.epsilon = epsilon
+        self.kernel = kernel
+        self.gamma = gamma
+        self.degree = degree
+        self.coef0 = coef0
+
+    def fit_gram(self, K_train, y, X_train):
+        """
+        Fit on the square kernel matrix of the training rows X_train.
+        """
+        self.svr_ = SVR(kernel="precomputed", C=self.C, epsilon=self.epsilon).fit(K_train, y)
+        self.support_vectors_ = X_train[self.svr_.support_]
+        return self
+
+    def predict_gram(self, K):
+        """
+        Predict from the kernel matrix between the test rows and the training rows.
+        """
+        return self.svr_.predict(K)
+
+    def predict(self, X):
+        K = kernel_matrix(np.asarray(X), self.support_vectors_, self.kernel, self.gamma, self.degree, self.coef0)
+        return K @ self.svr_.dual_coef_.ravel() + self.svr_.intercept_[0]
+
+
+class ApproximateSVR:
+    """
+    Linear epsilon-insensitive SVR, optionally on an approximate kernel feature map.
+
+    feature_map is "nystroem" (any SVR kernel), "rff" (random Fourier
+    features, rbf kernel only) or None for a linear SVR on the inputs. Fit
+    time grows linearly with the number of training rows, for n_components
+    features per row.
+    """
+
+    def __init__(self, C=1.0, epsilon=0.1, kernel="rbf", gamma="scale", degree=3, coef0=0.0,
+                 feature_map="nystroem", n_components=1000, random_state=0):
+        self.C = C
+        self.epsilon = epsilon
+        self.kernel = kernel
+        self.gamma = gamma
+        self.degree = degree
+        self.coef0 = coef0
+        self.feature_map = feature_map
+        self.n_components = n_components
+        self.random_state = random_state
+
+    def fit(self, X, y):
+        gamma = resolve_gamma(self.gamma, X)
+        n_components = min(self.n_components, len(X))
+        if self.feature_map == "nystroem":
+            self.map_ = Nystroem(
+                kernel=self.kernel, gamma=gamma, degree=self.degree, coef0=self.coef0,
+                n_components=n_components, random_state=self.random_state,
+            )
+        elif self.feature_map == "rff":
+            if self.kernel != "rbf":
+                raise ValueError(f"Random Fourier features approximate the rbf kernel only, not {self.kernel!r}")
+            self.map_ = RBFSampler(gamma=gamma, n_components=self.n_components, random_state=self.random_state)
+        else:
+            self.map_ = None
+
+        features = self.map_.fit_transform(X) if self.map_ is not None else X
+        self.svr_ = LinearSVR(C=self.C, epsilon=self.epsilon, max_iter=10_000, random_state=self.random_state)
+        self.svr_.fit(features, y)
+        return self
+
+    def predict(self, X):
+        return self.svr_.predict(self.map_.transform(X) if self.map_ is not None else X)
+
+
+def make_regressor(model_params, backend="exact", n_components=1000, random_state=0):
+    """
+    Unfitted regressor for SVR keyword arguments model_params on the given backend.
+    """
+    if backend == "exact":
+        return SVR(**model_params)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown SVR backend {backend!r}, expected one of {list(BACKENDS)}")
+    feature_map = None if backend == "linear" else backend
+    return ApproximateSVR(**model_params, feature_map=feature_map, n_components=n_components, random_state=random_state)
+
+
+def check_kernel_mode(kernel_mode, backend):
+    """
+    Raise ValueError for an unknown kernel mode, or for precomputed kernels on an approximate backend.
+    """
+    if kernel_mode not in KERNEL_MODES:
+        raise ValueError(f"Unknown kernel mode {kernel_mode!r}, expected one of {list(KERNEL_MODES)}")
+    if kernel_mode == "precomputed" and backend != "exact":
+        raise ValueError(f"Precomputed kernels need the exact backend, not {backend!r}")
+
+
+def regressor_from_env(default_kernel_mode="exact"):
+    """
+    (backend, n_components, kernel_mode) from WNV_SVR_BACKEND, WNV_SVR_COMPONENTS and WNV_KERNEL_MODE.
+
+    default_kernel_mode applies to the exact backend; approximate backends
+    default to "exact", since they cannot use precomputed kernels. The
+    combination is validated here, so a bad setting fails before any data
+    is loaded.
+    """
+    backend = os.environ.get("WNV_SVR_BACKEND", "exact")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown SVR backend {backend!r}, expected one of {list(BACKENDS)}")
+    n_components = int(os.environ.get("WNV_SVR_COMPONENTS", 1000))
+    kernel_mode = os.environ.get("WNV_KERNEL_MODE", default_kernel_mode if backend == "exact" else "exact")
+    check_kernel_mode(kernel_mode, backend)
+    return backend, n_components, kernel_mode
+
+
+def compare_backends(X_train, y_train, X_test, y_test, model_params, backends=BACKENDS, n_components=1000):
+    """
+    Fit model_params on every backend and compare accuracy and speed against exact SVR.
+
+    Returns a DataFrame with one row per backend: fit and predict seconds,
+    Q2 and RMSE on the test data, and prediction_rmse, the RMSE between the
+    backend's and exact SVR's test predictions (0 for exact itself).
+    """
+    rows = []
+    exact_predictions = None
+    for backend in ["exact", *(b for b in backends if b != "exact")]:
+        model = make_regressor(model_params, backend, n_components)
+        try:
+            start = time.perf_counter()
+            model.fit(X_train, y_train)
+            fit_seconds = time.perf_counter() - start
+        except ValueError as error:
+            print(f"Skipping backend {backend}: {error}")
+            continue
+        start = time.perf_counter()
+        predictions = model.predict(X_test)
+        predict_seconds = time.perf_counter() - start
+        if exact_predictions is None:
+            exact_predictions = predictions
+
+        q2, rmse = q2_rmse(y_test, predictions)
+        rows.append({
+            "backend": backend,
+            "fit_seconds": fit_seconds,
+            "predict_seconds": predict_seconds,
+            "q2": q2,
+            "RMSE": rmse,
+            "prediction_rmse": np.sqrt(metrics.mean_squared_error(exact_predictions, predictions)),
+        })
+    return pd.DataFrame(rows)
+
+
+def _init_worker(X_train, y_train, X_test, kernel_mode, kernel_cache_bytes, backend, n_components):
+    _worker_state.update(
+        X_train=X_train,
+        y_train=y_train,
+        X_test=X_test,
+        kernel_mode=kernel_mode,
+        kernel_cache=KernelCache(kernel_cache_bytes),
+        backend=backend,
+        n_components=n_components,
+    )
+
+
+def _fit_configs(keys, keep):
+    """
+    Fit a group of configs that share (kernel, gamma), and predict the test data.
+    """
+    state = _worker_state
+    X_train, y_train, X_test = state["X_train"], state["y_train"], state["X_test"]
+    results = []
+    for key in keys:
+        if state["kernel_mode"] == "precomputed":
+            C, epsilon, gamma, kernel = key
+            gamma = resolve_gamma(gamma, X_train)
+            K_train = state["kernel_cache"].get("train", X_train, X_train, kernel, gamma)
+            K_test = state["kernel_cache"].get("test", X_test, X_train, kernel, gamma)
+            model = KernelSVR(C=C, epsilon=epsilon, kernel=kernel, gamma=gamma).fit_gram(K_train, y_train, X_train)
+            predictions = model.predict_gram(K_test)
+        else:
+            model = make_regressor(svr_params(key), state["backend"], state["n_components"]).fit(X_train, y_train)
+            predictions = model.predict(X_test)
+        results.append((key, predictions, model if key in keep else None))
+    return results
+
+
+def evaluate_configs(keys, X_train, y_train, X_test, keep=(), n_workers=None,
+                     kernel_mode="exact", kernel_cache_bytes=1 << 30, backend="exact", n_components=1000):
+    """
+    Fit one SVR per distinct config key in a process pool and predict X_test.
+
+    With kernel_mode="precomputed", configs that share (kernel, gamma) run in
+    the same task and reuse one cached train and test kernel matrix, with
+    KernelSVR models. Groups larger than an even share of the configs per
+    worker are split across tasks, so one common (kernel, gamma) does not
+    serialize the run on a single worker; each worker then computes that
+    kernel once. Otherwise each config is fitted on the given backend
+    (see make_regressor). Returns {key: (predictions, model)}, where model is the
+    fitted model for the keys listed in keep and None for the others, so only
+    the models that are needed afterwards are sent back from the workers.
+    """
+    check_kernel_mode(kernel_mode, backend)
+    unique_keys = list(dict.fromkeys(keys))
+    keep = set(keep)
+    n_workers = n_workers or os.cpu_count()
+    if kernel_mode == "precomputed":
+        groups = {}
+        for key in unique_keys:
+            groups.setdefault((key[3], key[2]), []).append(key)
+        chunk_size = max(1, -(-len(unique_keys) // n_workers))
+        tasks = [group[i:i + chunk_size] for group in groups.values() for i in range(0, len(group), chunk_size)]
+    else:
+        tasks = [[key] for key in unique_keys]
+
+    results = {}
+    with ProcessPoolExecutor(
+        max_workers=max(1, min(n_workers, len(tasks))),
+        initializer=_init_worker,
+        initargs=(X_train, y_train, X_test, kernel_mode, kernel_cache_bytes, backend, n_components),
+    ) as executor:
+        futures = [executor.submit(_fit_configs, task, keep & set(task)) for task in tasks]
+        for future in as_completed(futures):
+            for key, predictions, model in future.result():
+                results[key] = (predictions, model)
+    return results
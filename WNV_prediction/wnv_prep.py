@@ -0,0 +1,202 @@
+"""
+County-month prep pipeline for the WNV datasets, one state at a time.
+
+base_table builds the Year x Month x County grid of a state's human case
+counts and joins the county locations, population and the CDC bird,
+mosquito and horse counts; add_features adds the ENSO, land use and climate
+features. 1_california_wnv_analysis_prep.py runs both on California in one
+go.
+
+prepare_states runs them for every state of a national build. Each task (a
+state, or a chunk of a large state's counties) goes to a worker process,
+which reads only that state's partitions of the State-partitioned case and
+CDC datasets and writes its rows straight to a State/Year-partitioned
+Parquet dataset. Memory is bounded by the largest chunk, not by the nation,
+and the output is read one state at a time by the statewise script.
+"""
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from wnv_cache import FeatureCache
+from wnv_features import add_oni, extract_climate, sample_land_cover
+from wnv_io import read_features, write_partitioned
+from wnv_profiling import StageRecorder
+
+CDC_COLUMNS = ["Total_Bird_WNV_Count", "Mos_WNV_Count", "Horse_WNV_Count", "Year", "Month", "County"]
+
+# Leading columns of the national output; the statewise script takes the columns after Date as features
+NATIONAL_ID_COLUMNS = ["State", "Year", "Month", "County", "FIPS", "Latitude", "Longitude", "Date"]
+
+# Per-worker inputs of a national build, set once by _init_worker
+_worker_state = {}
+
+
+def normalize_names(names):
+    """
+    Lower-case, stripped county or state names, the form the CDC tables use.
+    """
+    return names.str.lower().str.strip()
+
+
+def base_table(cases, locations, population, cdc, start_year, end_year, counties=None, name=None):
+    """
+    Year x Month x County grid with case counts, locations, population and CDC counts.
+
+    cases has County, Cases, Year and Month columns (one row per case
+    report), locations County, FIPS, Latitude, Longitude and optional extra
+    columns (e.g. Avian Phylodiversity), population County and Population,
+    and cdc the CDC_COLUMNS. The grid spans start_year to end_year and
+    counties, by default every county in cases. Missing case counts become 0
+    in the Human_Disease_Count column.
+    """
+    cases = (
+        cases[["County", "Cases", "Year", "Month"]]
+        .groupby(["Year", "Month", "County"], as_index=False)
+        .sum()
+    )
+    if counties is None:
+        counties = cases["County"].unique()
+
+    # Create a full dataset with all combinations of Year, Month, and County
+    grid = pd.DataFrame(
+        [(year, month, county) for year in range(start_year, end_year + 1) for month in range(1, 13) for county in counties],
+        columns=["Year", "Month", "County"]
+    )
+    data = grid.merge(cases, how="left", on=["Year", "Month", "County"])
+    prefix = f"{name}: " if name else ""
+    print(f"{prefix}NaN ratio in Cases:", data["Cases"].isna().mean())
+
+    # Merge FIPS and geographic data
+    data = data.merge(locations, how="left", on="County")
+    print(f"{prefix}Missing FIPS values:", data["FIPS"].isna().sum())
+    extra_columns = [col for col in locations.columns if col not in ("County", "FIPS", "Latitude", "Longitude")]
+    data = data[["Year", "Month", "County", "FIPS", "Latitude", "Longitude", "Cases", *extra_columns]]
+
+    # Merge population and CDC data
+    data = data.merge(population[["County", "Population"]], how="left", on="County")
+    data = data.rename(columns={"Cases": "Human_Disease_Count"})
+    data = data.merge(cdc, how="left", on=["Year", "Month", "County"])
+    data["Human_Disease_Count"] = data["Human_Disease_Count"].fillna(0)
+    return data
+
+
+def add_features(data, enso, land_use_dir, climate_path, cache=None, recorder=None):
+    """
+    Add the El Nino/La Nina, land use and climate features to the county-month rows.
+    """
+    recorder = recorder or StageRecorder("wnv_prep")
+
+    # Add El Nino/La Nina data
+    print("Adding El Nino/La Nina data...")
+    with recorder.stage("enso_join", rows=len(data)):
+        data = add_oni(data, enso)
+    print("Finished adding El Nino/La Nina data.")
+
+    # Add land use data
+    print("Adding land use data...")
+    with recorder.stage("land_use_sampling", rows=len(data)):
+        data = data.merge(sample_land_cover(data, land_use_dir, cache=cache), how="left", on=["Latitude", "Longitude"])
+    print("Finished adding land use data.")
+
+    # Add climate data
+    print("Adding climate data...")
+    with recorder.stage("climate_extraction", rows=len(data)):
+        data["Date"] = pd.to_datetime(data[["Year", "Month"]].assign(day=1))
+        data = extract_climate(data, climate_path, cache=cache)
+    print("Finished adding climate data.")
+    return data
+
+
+def _init_worker(sources, locations, population, enso, start_year, end_year, output_path, cache_path):
+    _worker_state.update(
+        sources=sources,
+        locations=locations,
+        population=population,
+        enso=enso,
+        start_year=start_year,
+        end_year=end_year,
+        output_path=output_path,
+        cache=FeatureCache(cache_path) if cache_path else None,
+    )
+
+
+def _prepare_chunk(state, chunk_index, counties):
+    """
+    Prepare the rows of one state's chunk of counties and write them to the output dataset.
+    """
+    worker = _worker_state
+    sources = worker["sources"]
+    cases = read_features(sources["cases"], columns=["County", "Cases", "Year", "Month"], states=[state])
+    cases["County"] = normalize_names(cases["County"])
+    cdc = read_features(sources["cdc"], columns=CDC_COLUMNS, states=[state])
+    cdc["County"] = normalize_names(cdc["County"])
+    # County names repeat across states, so the national tables are narrowed by state first
+    locations = worker["locations"]
+    locations = locations[(locations["State"] == state) & locations["County"].isin(counties)].drop(columns="State")
+    population = worker["population"]
+    population = population[population["State"] == state]
+
+    data = base_table(
+        cases[cases["County"].isin(counties)],
+        locations,
+        population,
+        cdc[cdc["County"].isin(counties)],
+        worker["start_year"], worker["end_year"], counties=counties, name=f"{state}[{chunk_index}]",
+    )
+    data = add_features(data, worker["enso"], sources["land_use"], sources["climate"], worker["cache"])
+    data.insert(0, "State", state)
+    data = data[NATIONAL_ID_COLUMNS + [col for col in data.columns if col not in NATIONAL_ID_COLUMNS]]
+
+    # Each chunk adds its own files to the state's Year partitions
+    write_partitioned(
+        data, worker["output_path"], ["State", "Year"],
+        basename_template=f"chunk{chunk_index:05d}-{{i}}.parquet", existing_data_behavior="overwrite_or_ignore",
+    )
+    return state, chunk_index, len(data)
+
+
+def prepare_states(sources, locations, population, enso, start_year, end_year, output_path, states=None,
+                   counties_per_chunk=200, n_workers=None, cache_path=None):
+    """
+    Build the county-month dataset of every state in a process pool, writing State/Year partitions.
+
+    sources holds the paths of the "cases" and "cdc" CSV files (read from
+    their State-partitioned Parquet copies), the "land_use" raster directory
+    and the "climate" NetCDF file. locations and population are the national
+    county tables with a State column, and state names in every input use the
+    normalize_names form. Each state's counties with coordinates are split
+    into chunks of counties_per_chunk, one task each. The partitions of the
+    states being built are replaced. Returns {state: rows written}.
+    """
+    locations = locations.assign(State=normalize_names(locations["State"]), County=normalize_names(locations["County"]))
+    population = population.assign(State=normalize_names(population["State"]), County=normalize_names(population["County"]))
+    located = locations.dropna(subset=["Latitude", "Longitude"])
+    if len(located) < len(locations):
+        print(f"Skipping {len(locations) - len(located)} counties without coordinates")
+    states = sorted(states or located["State"].unique())
+
+    tasks = []
+    for state in states:
+        counties = sorted(located.loc[located["State"] == state, "County"].unique())
+        tasks.extend(
+            (state, i // counties_per_chunk, counties[i:i + counties_per_chunk])
+            for i in range(0, len(counties), counties_per_chunk)
+        )
+        # Drop the state's old partitions, since the chunks only ever add files
+        shutil.rmtree(os.path.join(output_path, f"State={state}"), ignore_errors=True)
+
+    rows = {state: 0 for state in states}
+    with ProcessPoolExecutor(
+        max_workers=max(1, min(n_workers or os.cpu_count(), len(tasks))),
+        initializer=_init_worker,
+        initargs=(sources, located, population, enso, start_year, end_year, output_path, cache_path),
+    ) as executor:
+        futures = [executor.submit(_prepare_chunk, *task) for task in tasks]
+        for future in as_completed(futures):
+            state, chunk_index, n_rows = future.result()
+            rows[state] += n_rows
+            print(f"State: {state}, chunk {chunk_index}: {n_rows} rows")
+    return rows
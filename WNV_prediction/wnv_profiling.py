@@ -0,0 +1,192 @@
+"""
+Opt-in stage instrumentation for the WNV scripts.
+
+Each script's main(recorder) is decorated with profiled_main, and wraps its
+logical stages (loading, feature joins, fitting, SHAP, plotting) in
+recorder.stage(name). When WNV_PROFILE names an output file,
+every stage records its wall time, CPU time (including finished worker
+processes), resident memory and row count, and the records are written at
+the end of the run: as JSON for a .json path, or in the Prometheus text
+exposition format for a .prom path (for the node_exporter textfile
+collector). Without WNV_PROFILE the stages cost nothing beyond two clock reads.
+
+WNV_PROFILE_STAGE attaches a profiler to one stage by name, cProfile by
+default or pyinstrument with WNV_PROFILER=pyinstrument; its output is written
+next to the metrics file as <stem>.<stage>.prof (or .html).
+"""
+import cProfile
+import functools
+import json
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+
+# Metrics output (.json or .prom), the stage to profile and the profiler to use
+PROFILE_OUTPUT = os.environ.get("WNV_PROFILE")
+PROFILE_STAGE = os.environ.get("WNV_PROFILE_STAGE")
+PROFILER = os.environ.get("WNV_PROFILER", "cprofile")
+
+
+def max_rss_mb(who):
+    """
+    Peak resident memory in MiB of resource.RUSAGE_SELF or of the largest finished RUSAGE_CHILDREN process.
+    """
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    max_rss = resource.getrusage(who).ru_maxrss
+    return max_rss / 2**20 if sys.platform == "darwin" else max_rss / 2**10
+
+
+def _rss_mb():
+    """
+    Current resident memory of this process, or None where /proc is not available.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return None
+
+
+def cpu_seconds():
+    """
+    User and system CPU time of this process and its finished child processes.
+    """
+    usage = [resource.getrusage(who) for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)]
+    return sum(u.ru_utime + u.ru_stime for u in usage)
+
+
+class StageRecorder:
+    """
+    Collects one record per stage of a script run and writes them at the end.
+
+    stage() yields a dict the caller can fill in, typically with
+    info["rows"] = len(data); its entries are added to the stage record.
+    """
+
+    def __init__(self, script, output=None, profile_stage=None, profiler="cprofile"):
+        self.script = script
+        self.output = output
+        self.profile_stage = profile_stage
+        self.profiler = profiler
+        self.records = []
+
+    @property
+    def enabled(self):
+        return bool(self.output)
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        info = {} if rows is None else {"rows": rows}
+        if not self.enabled:
+            yield info
+            return
+
+        profiler = self._start_profiler() if name == self.profile_stage else None
+        rss_start = _rss_mb()
+        cpu_start = cpu_seconds()
+        wall_start = time.perf_counter()
+        try:
+            yield info
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = cpu_seconds() - cpu_start
+            if profiler is not None:
+                self._stop_profiler(profiler, name)
+            self.records.append({
+                "stage": name,
+                "wall_seconds": wall,
+                "cpu_seconds": cpu,
+                "rss_start_mb": rss_start,
+                "rss_end_mb": _rss_mb(),
+                "max_rss_mb": max_rss_mb(resource.RUSAGE_SELF),
+                "max_worker_rss_mb": max_rss_mb(resource.RUSAGE_CHILDREN),
+                **info,
+            })
+
+    def add(self, name, **values):
+        """
+        Record a stage measured elsewhere, e.g. fit times summed over worker processes.
+        """
+        if self.enabled:
+            self.records.append({"stage": name, **values})
+
+    def _start_profiler(self):
+        if self.profiler == "pyinstrument":
+            from pyinstrument import Profiler
+
+            profiler = Profiler()
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        return profiler
+
+    def _stop_profiler(self, profiler, name):
+        stem = os.path.splitext(self.output)[0]
+        if self.profiler == "pyinstrument":
+            profiler.stop()
+            with open(f"{stem}.{name}.html", "w") as f:
+                f.write(profiler.output_html())
+        else:
+            profiler.disable()
+            profiler.dump_stats(f"{stem}.{name}.prof")
+
+    def write(self):
+        """
+        Write the stage records to the output file, replacing it atomically.
+        """
+        if not self.enabled:
+            return
+        if self.output.endswith(".prom"):
+            content = self._prometheus()
+        else:
+            content = json.dumps({"script": self.script, "timestamp": time.time(), "stages": self.records}, indent=2)
+        # The textfile collector may read at any time, so never expose a half-written file
+        tmp_path = f"{self.output}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(content)
+        os.replace(tmp_path, self.output)
+
+    def _prometheus(self):
+        lines = []
+        metrics = sorted({key for record in self.records for key, value in record.items()
+                          if key != "stage" and isinstance(value, (int, float))})
+        for metric in metrics:
+            lines.append(f"# TYPE wnv_stage_{metric} gauge")
+            for record in self.records:
+                value = record.get(metric)
+                if isinstance(value, (int, float)):
+                    lines.append(f'wnv_stage_{metric}{{script="{self.script}",stage="{record["stage"]}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+def stage_recorder(script):
+    """
+    StageRecorder for a script, configured from the WNV_PROFILE* environment variables.
+    """
+    return StageRecorder(script, PROFILE_OUTPUT, PROFILE_STAGE, PROFILER)
+
+
+@contextmanager
+def profiled(script):
+    """
+    stage_recorder of a script run; its records are written when the block completes.
+    """
+    recorder = stage_recorder(script)
+    yield recorder
+    recorder.write()
+
+
+def profiled_main(script):
+    """
+    Decorator for a script's main(recorder), making main() run inside profiled(script).
+    """
+    def decorate(main):
+        @functools.wraps(main)
+        def run():
+            with profiled(script) as recorder:
+                return main(recorder)
+        return run
+    return decorate
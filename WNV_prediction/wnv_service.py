@@ -0,0 +1,251 @@
+"""
+FastAPI prediction service for the WNV SVR models.
+
+At startup, every scaler+model bundle that 3_wnv_svm_with_shap.py saved to
+results/SVM/models/<model_name>.joblib is loaded once and warmed up with one
+prediction. Requests carry one county-month feature dict or a list of them;
+concurrent requests for the same model are coalesced by a MicroBatcher into
+one matrix, so the scaler and the model run one vectorized predict per
+batch instead of one per request. A batch is sent after WNV_BATCH_WAIT_MS
+milliseconds or once WNV_MAX_BATCH_ROWS rows are queued.
+
+/metrics exposes request, row and batch counters, latency quantiles and
+throughput in the Prometheus text format.
+
+    uvicorn wnv_service:app --port 8001
+"""
+import asyncio
+import glob
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, List, Union
+
+import joblib
+import numpy as np
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+
+# Set the base directory for relative paths
+BASE_DIR = os.environ.get("WNV_BASE_DIR", os.path.dirname(os.path.abspath(__file__)))
+
+# Directory of the saved model bundles, and the model used by /predict (default: the last tuning year)
+MODELS_DIR = os.environ.get("WNV_MODELS_DIR", os.path.join(BASE_DIR, "results", "SVM", "models"))
+DEFAULT_MODEL = os.environ.get("WNV_DEFAULT_MODEL")
+
+# Micro-batching: how long the first queued request waits for others, and the most rows per predict call
+BATCH_WAIT_SECONDS = float(os.environ.get("WNV_BATCH_WAIT_MS", 2)) / 1000
+MAX_BATCH_ROWS = int(os.environ.get("WNV_MAX_BATCH_ROWS", 4096))
+
+# Recent request latencies kept for the /metrics quantiles
+LATENCY_WINDOW = 10_000
+
+# One county-month: feature name -> value; extra keys such as FIPS or Month are ignored
+Features = Dict[str, float]
+
+
+def load_bundles(models_dir):
+    """
+    {model_name: bundle} of the saved bundles, ordered by tuning year.
+    """
+    bundles = [joblib.load(path) for path in glob.glob(os.path.join(models_dir, "*.joblib"))]
+    return {bundle["model_name"]: bundle for bundle in sorted(bundles, key=lambda bundle: bundle["tuning_year"])}
+
+
+class Metrics:
+    """
+    Counters and a window of recent latencies, rendered in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.requests = 0
+        self.rows = 0
+        self.batches = 0
+        self.batch_rows = 0
+        self.predict_seconds = 0.0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def observe_request(self, rows, seconds):
+        self.requests += 1
+        self.rows += rows
+        self.latencies.append(seconds)
+
+    def observe_batch(self, rows, seconds):
+        self.batches += 1
+        self.batch_rows += rows
+        self.predict_seconds += seconds
+
+    def render(self):
+        uptime = time.monotonic() - self.started
+        values = [
+            ("wnv_service_requests_total", "counter", self.requests),
+            ("wnv_service_rows_total", "counter", self.rows),
+            ("wnv_service_batches_total", "counter", self.batches),
+            ("wnv_service_predict_seconds_total", "counter", self.predict_seconds),
+            ("wnv_service_mean_batch_rows", "gauge", self.batch_rows / self.batches if self.batches else 0.0),
+            ("wnv_service_rows_per_second", "gauge", self.rows / uptime if uptime > 0 else 0.0),
+            ("wnv_service_uptime_seconds", "gauge", uptime),
+        ]
+        lines = []
+        for name, kind, value in values:
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {value}")
+        lines.append("# TYPE wnv_service_request_latency_seconds summary")
+        if self.latencies:
+            latencies = np.fromiter(self.latencies, dtype=np.float64)
+            for quantile in (0.5, 0.95, 0.99):
+                lines.append(f'wnv_service_request_latency_seconds{{quantile="{quantile}"}} {np.quantile(latencies, quantile)}')
+        lines.append(f"wnv_service_request_latency_seconds_count {len(self.latencies)}")
+        lines.append(f"wnv_service_request_latency_seconds_sum {sum(self.latencies)}")
+        return "\n".join(lines) + "\n"
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent prediction requests for one model into vectorized predict calls.
+
+    predict() queues a feature matrix and awaits its predictions; a
+    background task drains the queue into batches and runs scaler and model
+    in a worker thread, so the event loop keeps accepting requests meanwhile.
+    """
+
+    def __init__(self, bundle, metrics, max_wait=BATCH_WAIT_SECONDS, max_rows=MAX_BATCH_ROWS):
+        self.scaler = bundle["scaler"]
+        self.model = bundle["model"]
+        self.metrics = metrics
+        self.max_wait = max_wait
+        self.max_rows = max_rows
+        self.queue = asyncio.Queue()
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
+    def predict_matrix(self, X):
+        # The StandardScaler transform, without its feature-name check against the training DataFrame
+        return self.model.predict((X - self.scaler.mean_) / self.scaler.scale_)
+
+    async def predict(self, X):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((X, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            rows = len(batch[0][0])
+            deadline = loop.time() + self.max_wait
+            while rows < self.max_rows:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                rows += len(item[0])
+
+            start = time.perf_counter()
+            try:
+                predictions = await asyncio.to_thread(self.predict_matrix, np.vstack([X for X, _ in batch]))
+            except Exception as error:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            self.metrics.observe_batch(rows, time.perf_counter() - start)
+
+            # Hand each request its slice of the batch predictions
+            offset = 0
+            for X, future in batch:
+                if not future.done():
+                    future.set_result(predictions[offset:offset + len(X)])
+                offset += len(X)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    app.state.bundles = load_bundles(MODELS_DIR)
+    if not app.state.bundles:
+        raise RuntimeError(f"No model bundles in {MODELS_DIR}; run 3_wnv_svm_with_shap.py first")
+    app.state.metrics = Metrics()
+    app.state.batchers = {}
+    for name, bundle in app.state.bundles.items():
+        batcher = MicroBatcher(bundle, app.state.metrics)
+        # Warm up so the first request does not pay for lazy initialization
+        batcher.predict_matrix(np.zeros((1, len(bundle["feature_names"]))))
+        batcher.start()
+        app.state.batchers[name] = batcher
+    app.state.default_model = DEFAULT_MODEL or list(app.state.bundles)[-1]
+    yield
+    for batcher in app.state.batchers.values():
+        await batcher.stop()
+
+
+app = FastAPI(title="WNV prediction service", lifespan=lifespan)
+
+
+def _feature_matrix(rows, feature_names):
+    missing = sorted({name for row in rows for name in feature_names if name not in row})
+    if missing:
+        raise HTTPException(status_code=422, detail=f"Missing features: {missing}")
+    X = np.array([[row[name] for name in feature_names] for row in rows], dtype=np.float64)
+    # Rejected here, before queuing, since a NaN or Inf would fail the predict of the whole coalesced batch
+    non_finite = sorted({feature_names[j] for j in np.flatnonzero(~np.isfinite(X).all(axis=0))})
+    if non_finite:
+        raise HTTPException(status_code=422, detail=f"Non-finite feature values: {non_finite}")
+    return X
+
+
+@app.get("/models")
+async def list_models():
+    return {
+        "default": app.state.default_model,
+        "models": {
+            name: {"tuning_year": bundle["tuning_year"], "params": bundle["params"], "features": bundle["feature_names"]}
+            for name, bundle in app.state.bundles.items()
+        },
+    }
+
+
+@app.post("/models/{model_name}/predict")
+async def predict_model(model_name: str, payload: Union[Features, List[Features]]):
+    """
+    Predict human disease counts for one county-month feature dict or a list of them.
+    """
+    start = time.perf_counter()
+    if model_name not in app.state.batchers:
+        raise HTTPException(status_code=404, detail=f"Unknown model {model_name!r}")
+    rows = payload if isinstance(payload, list) else [payload]
+    if not rows:
+        return {"model": model_name, "predictions": []}
+    X = _feature_matrix(rows, app.state.bundles[model_name]["feature_names"])
+    predictions = await app.state.batchers[model_name].predict(X)
+    app.state.metrics.observe_request(len(rows), time.perf_counter() - start)
+    if isinstance(payload, list):
+        return {"model": model_name, "predictions": predictions.tolist()}
+    return {"model": model_name, "prediction": float(predictions[0])}
+
+
+@app.post("/predict")
+async def predict(payload: Union[Features, List[Features]]):
+    """
+    Predict with the default model.
+    """
+    return await predict_model(app.state.default_model, payload)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return app.state.metrics.render()
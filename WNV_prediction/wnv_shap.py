@@ -0,0 +1,195 @@
+"""
+Fast SHAP explanations for the WNV SVR models.
+
+Rather than a model-agnostic explainer with the full test set as background,
+the background is summarized with k-means into a small set of weighted points,
+the rows to explain can be subsampled, model predictions are evaluated in
+fixed-size batches, and the rows are explained in parallel across a process
+pool. Global importance is reported with bootstrap confidence intervals.
+
+Local explanations are rendered in a process pool where each worker reuses
+one Agg figure, or written as a single per-row table instead of images.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import shap
+from matplotlib import pyplot as plt
+
+# Per-worker explainer, built once by _init_worker
+_worker_state = {}
+
+# Per-worker figure, built once by _init_renderer
+_render_state = {}
+
+
+class BatchedPredict:
+    """
+    Picklable predict callable that evaluates the model in batches of batch_size rows.
+
+    Kernel SHAP evaluates the model on (background size x coalitions) synthetic
+    rows per explained row; batching keeps that memory bounded.
+    """
+
+    def __init__(self, model, batch_size=10_000):
+        self.model = model
+        self.batch_size = batch_size
+
+    def __call__(self, X):
+        X = np.asarray(X)
+        if len(X) == 0:
+            return np.empty(0)
+        return np.concatenate([
+            self.model.predict(X[start:start + self.batch_size]) for start in range(0, len(X), self.batch_size)
+        ])
+
+
+def _init_worker(predict, background, nsamples):
+    _worker_state["explainer"] = shap.KernelExplainer(predict, background)
+    _worker_state["nsamples"] = nsamples
+
+
+def _explain_rows(X):
+    return _worker_state["explainer"].shap_values(X, nsamples=_worker_state["nsamples"], silent=True)
+
+
+def explain(model, X, feature_names, background=None, background_size=50, n_explain=None,
+            nsamples="auto", batch_size=10_000, n_workers=None, seed=0):
+    """
+    Explain model predictions on the rows of X with Kernel SHAP.
+
+    background (default X) is summarized to background_size weighted k-means
+    centroids. If n_explain is set and smaller than len(X), a random subset
+    of that many rows is explained. Returns (explanation, rows), where
+    explanation is a shap.Explanation over the explained rows and rows holds
+    their positions in X.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    background = X if background is None else np.asarray(background, dtype=np.float64)
+    summary = shap.kmeans(background, min(background_size, len(background)))
+
+    if n_explain and n_explain < len(X):
+        rng = np.random.default_rng(seed)
+        rows = np.sort(rng.choice(len(X), size=n_explain, replace=False))
+    else:
+        rows = np.arange(len(X))
+    X_explain = X[rows]
+
+    predict = BatchedPredict(model, batch_size)
+    n_workers = n_workers or os.cpu_count()
+    chunks = np.array_split(X_explain, min(4 * n_workers, len(X_explain)))
+    with ProcessPoolExecutor(
+        max_workers=n_workers, initializer=_init_worker, initargs=(predict, summary, nsamples)
+    ) as executor:
+        values = np.vstack(list(executor.map(_explain_rows, chunks)))
+
+    base_value = shap.KernelExplainer(predict, summary).expected_value
+    explanation = shap.Explanation(
+        values=values,
+        base_values=np.full(len(rows), base_value),
+        data=X_explain,
+        feature_names=list(feature_names),
+    )
+    return explanation, rows
+
+
+def global_importance(explanation, n_boot=1000, alpha=0.05, seed=0):
+    """
+    Mean |SHAP| per feature with a percentile bootstrap confidence interval.
+
+    The interval resamples the explained rows, so it states how much the
+    ranking could move with a different sample of rows. Returns a DataFrame
+    sorted by importance with columns feature, mean_abs_shap, ci_lower and
+    ci_upper.
+    """
+    abs_values = np.abs(explanation.values)
+    rng = np.random.default_rng(seed)
+    boot = np.empty((n_boot, abs_values.shape[1]))
+    for b in range(n_boot):
+        boot[b] = abs_values[rng.integers(0, len(abs_values), size=len(abs_values))].mean(axis=0)
+
+    importance = pd.DataFrame({
+        "feature": explanation.feature_names,
+        "mean_abs_shap": abs_values.mean(axis=0),
+        "ci_lower": np.percentile(boot, 100 * alpha / 2, axis=0),
+        "ci_upper": np.percentile(boot, 100 * (1 - alpha / 2), axis=0),
+    })
+    return importance.sort_values("mean_abs_shap", ascending=False).reset_index(drop=True)
+
+
+def _init_renderer(figsize, dpi, max_display):
+    plt.switch_backend("Agg")
+    _render_state.update(
+        figure=plt.figure(figsize=figsize, dpi=dpi),
+        figsize=figsize,
+        max_display=max_display,
+    )
+
+
+def _render_chunk(values, base_values, data, feature_names, paths):
+    figure = _render_state["figure"]
+    for i, path in enumerate(paths):
+        figure.clf()
+        plt.figure(figure.number)
+        row = shap.Explanation(
+            values=values[i], base_values=base_values[i], data=data[i], feature_names=feature_names
+        )
+        shap.plots.bar(row, show=False, max_display=_render_state["max_display"])
+        # shap resizes the current figure to fit the bars
+        figure.set_size_inches(_render_state["figsize"])
+        figure.tight_layout()
+        figure.savefig(path)
+    return len(paths)
+
+
+def render_local_plots(explanation, paths, figsize=(12, 6), dpi=100, max_display=17, n_workers=None, chunk_size=50):
+    """
+    Save one SHAP bar plot per explained row, to the matching entry of paths.
+
+    Rows are rendered in chunks across a process pool; each worker draws
+    every plot on the same Agg figure instead of creating one per row.
+    """
+    n_workers = n_workers or os.cpu_count()
+    feature_names = list(explanation.feature_names)
+    with ProcessPoolExecutor(
+        max_workers=n_workers, initializer=_init_renderer, initargs=(figsize, dpi, max_display)
+    ) as executor:
+        futures = [
+            executor.submit(
+                _render_chunk,
+                explanation.values[start:start + chunk_size],
+                explanation.base_values[start:start + chunk_size],
+                explanation.data[start:start + chunk_size],
+                feature_names,
+                paths[start:start + chunk_size],
+            )
+            for start in range(0, len(paths), chunk_size)
+        ]
+        for future in as_completed(futures):
+            future.result()
+
+
+def write_local_table(explanation, index, path):
+    """
+    Write the per-row SHAP values as one table, instead of one image per row.
+
+    index is a DataFrame of row identifiers (e.g. Year, Month, FIPS) aligned
+    with the explained rows. The table holds those columns, the base value,
+    the explained prediction and one shap_<feature> column per feature. The
+    format follows the extension of path: .parquet or .html.
+    """
+    table = index.reset_index(drop=True).assign(
+        base_value=explanation.base_values,
+        prediction=explanation.base_values + explanation.values.sum(axis=1),
+    )
+    shap_values = pd.DataFrame(explanation.values, columns=[f"shap_{name}" for name in explanation.feature_names])
+    table = pd.concat([table, shap_values], axis=1)
+
+    if path.endswith(".parquet"):
+        table.to_parquet(path, index=False)
+    elif path.endswith(".html"):
+        table.to_html(path, index=False, float_format="{:.4f}".format)
+    else:
+        raise ValueError(f"Unsupported SHAP table format: {path}")
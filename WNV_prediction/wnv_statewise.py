@@ -0,0 +1,360 @@
+"""
+State-parallel SVR runner for the national CDC dataset.
+
+The dataset is grouped by State once, and each state's rows are shipped to a
+worker pool as compact NumPy blocks (features, years, labels) instead of
+re-filtering the national DataFrame per state; read_state_blocks reads a
+State-partitioned dataset one state at a time instead of loading it whole. Results are gathered as
+workers finish; a state that runs past its deadline is reported as timed out
+and one whose worker dies (e.g. killed for memory) as an error, instead of
+blocking the report, and every finished state is appended to a
+JSON Lines checkpoint so an interrupted run can resume where it stopped.
+
+For confidence intervals, the balance-and-fit step is repeated over many
+replicates per state, each drawing its balanced rows as indices from its own
+seed. (state, replicate chunk) tasks are scheduled largest first, so the big
+states start early and the small ones fill in the remaining cores.
+"""
+import json
+import multiprocessing
+import os
+import queue
+import time
+
+import numpy as np
+from sklearn import metrics
+from sklearn.svm import SVR
+from sklearn.utils import resample
+
+from wnv_design import weighted_mean_std
+from wnv_io import partition_values, read_features
+from wnv_models import check_kernel_mode, kernel_matrix, make_regressor, resolve_gamma
+
+# States whose checkpointed result is final; timed-out and failed states are retried on resume
+FINAL_STATUSES = ("ok", "empty")
+
+METRICS = ("mse", "msle", "q2")
+
+# Seconds between checks for timed-out tasks and dead workers
+POLL_SECONDS = 1.0
+
+# Queue on which pool workers report (task id, pid) as they start a task, set once by _init_worker
+_worker_state = {}
+
+
+def state_blocks(data, target_column, first_feature_after="Date"):
+    """
+    Yield (state, X, years, y) for each state, in order of first appearance.
+
+    Features are the columns after first_feature_after, except Year and the
+    target; rows with a missing feature, year or label are dropped.
+    """
+    start = data.columns.get_loc(first_feature_after) + 1
+    feature_columns = [col for col in data.columns[start:] if col not in ("Year", target_column)]
+    columns = feature_columns + ["Year", target_column]
+    for state, state_data in data.groupby("State", sort=False):
+        block = state_data[columns].dropna()
+        yield (
+            state,
+            np.ascontiguousarray(block[feature_columns].to_numpy(dtype=np.float64)),
+            block["Year"].to_numpy(),
+            block[target_column].to_numpy(dtype=np.float64),
+        )
+
+
+def read_state_blocks(csv_path, target_column, first_feature_after="Date", index_col=None, prepare=None):
+    """
+    state_blocks over a State-partitioned dataset, reading one state at a time.
+
+    Only one state's rows are in memory as a DataFrame at any time; prepare,
+    if given, is applied to each state's DataFrame before it is split.
+    """
+    for state in partition_values(csv_path, "State"):
+        data = read_features(csv_path, states=[state], index_col=index_col)
+        if prepare is not None:
+            data = prepare(data)
+        yield from state_blocks(data, target_column, first_feature_after)
+
+
+def balance_indices(y, random_state=123):
+    """
+    Row indices that balance zero and non-zero labels.
+
+    The majority class is downsampled to the size of the minority class, or
+    the minority class upsampled to the size of the majority class. This
+    draws the same rows, in the same order, as resampling the DataFrames.
+    """
+    majority = np.flatnonzero(y == 0)
+    minority = np.flatnonzero(y > 0)
+    if len(majority) > len(minority):
+        majority = resample(majority, replace=False, n_samples=len(minority), random_state=random_state)
+    else:
+        minority = resample(minority, replace=True, n_samples=len(majority), random_state=random_state)
+    return np.concatenate([majority, minority])
+
+
+def replicate_seed(seed, replicate):
+    """
+    Balancing seed of one replicate; replicate 0 uses seed itself, i.e. the single-draw result.
+    """
+    if replicate == 0:
+        return seed
+    return int(np.random.SeedSequence(seed, spawn_key=(replicate,)).generate_state(1)[0])
+
+
+def _scores(y_test, predictions, y):
+    predictions = np.maximum(predictions, 0)
+    return {
+        "mse": metrics.mean_squared_error(y_test, predictions),
+        "msle": metrics.mean_squared_log_error(y_test, predictions),
+        "q2": metrics.r2_score(y_test, predictions),
+        "total_rows": len(y),
+        "non_zero_rows": int((y > 0).sum()),
+    }
+
+
+def fit_state(X, years, y, model_params, test_start_year=2018, random_state=123, backend="exact", n_components=1000):
+    """
+    Train an SVR on one state's balanced rows before test_start_year and score it on the rest.
+
+    backend selects the regressor (see wnv_models.make_regressor).
+
+    Returns a dict with mse, msle, q2, total_rows and non_zero_rows, or
+    None when the state has no training or no test rows.
+    """
+    indices = balance_indices(y, random_state)
+    X, years, y = X[indices], years[indices], y[indices]
+    is_train = years < test_start_year
+    if is_train.all() or not is_train.any():
+        return None
+
+    X_train, X_test = X[is_train], X[~is_train]
+    mean, std = weighted_mean_std(X_train, np.ones(len(X_train)))
+
+    model = make_regressor(model_params, backend, n_components)
+    model.fit((X_train - mean) / std, y[is_train])
+    return _scores(y[~is_train], model.predict((X_test - mean) / std), y)
+
+
+def fit_replicates(X, years, y, model_params, replicates, seed=123, kernel_mode="exact", test_start_year=2018,
+                   backend="exact", n_components=1000):
+    """
+    Run fit_state for each replicate number in replicates and return the list of results.
+
+    With kernel_mode="precomputed" the state's rows are standardized once on
+    all of its rows before test_start_year, and every replicate is fitted on a
+    gather of one kernel matrix over those rows instead of evaluating the
+    kernel again; results differ slightly from exact mode through the scaling.
+    """
+    if kernel_mode == "exact":
+        return [
+            fit_state(X, years, y, model_params, test_start_year, replicate_seed(seed, replicate), backend, n_components)
+            for replicate in replicates
+        ]
+
+    before = years < test_start_year
+    if not before.any():
+        return [None] * len(replicates)
+    mean, std = weighted_mean_std(X[before], np.ones(before.sum()))
+    X_scaled = (X - mean) / std
+    kernel = model_params.get("kernel", "rbf")
+    gamma = resolve_gamma(model_params.get("gamma", "scale"), X_scaled[before])
+    gram = kernel_matrix(
+        X_scaled, X_scaled, kernel, gamma, model_params.get("degree", 3), model_params.get("coef0", 0.0)
+    )
+
+    results = []
+    for replicate in replicates:
+        indices = balance_indices(y, replicate_seed(seed, replicate))
+        is_train = years[indices] < test_start_year
+        train, test = indices[is_train], indices[~is_train]
+        if len(train) == 0 or len(test) == 0:
+            results.append(None)
+            continue
+        model = SVR(kernel="precomputed", C=model_params.get("C", 1.0), epsilon=model_params.get("epsilon", 0.1))
+        model.fit(gram[np.ix_(train, train)], y[train])
+        results.append(_scores(y[test], model.predict(gram[np.ix_(test, train)]), y[indices]))
+    return results
+
+
+def summarize(results, alpha=0.05):
+    """
+    Combine the replicate results of one state into a single record.
+
+    Each metric gets its mean over the replicates and <metric>_lower /
+    <metric>_upper percentile bounds; with one replicate the bounds equal the
+    value. Row counts are the mean over the replicates.
+    """
+    summary = {"replicates": len(results)}
+    for name in METRICS:
+        values = np.array([result[name] for result in results])
+        summary[name] = float(values.mean())
+        summary[f"{name}_lower"] = float(np.percentile(values, 100 * alpha / 2))
+        summary[f"{name}_upper"] = float(np.percentile(values, 100 * (1 - alpha / 2)))
+    for name in ("total_rows", "non_zero_rows"):
+        summary[name] = float(np.mean([result[name] for result in results]))
+    return summary
+
+
+def _init_worker(started):
+    _worker_state["started"] = started
+
+
+def _run_task(task_id, *args):
+    """
+    Report which worker runs the task, then run fit_replicates.
+    """
+    _worker_state["started"].put((task_id, os.getpid()))
+    return fit_replicates(*args)
+
+
+def read_checkpoint(path):
+    """
+    Return {state: record} from a JSON Lines checkpoint, keeping the last record per state.
+    """
+    records = {}
+    if path and os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    records[record["state"]] = record
+    return records
+
+
+def run_states(blocks, model_params, n_workers=None, timeout=None, checkpoint_path=None, resume=False,
+               n_replicates=1, chunk_size=10, kernel_mode="exact", seed=123, backend="exact", n_components=1000):
+    """
+    Fit every state block in a process pool and return {state: record}.
+
+    Each state's replicates are split into tasks of chunk_size replicates,
+    and all tasks are submitted largest first by estimated cost (rows
+    squared times replicates). Each record holds the state, a status ("ok",
+    "empty", "timeout" or "error") and, for "ok", the summarize() fields.
+    timeout is the limit in seconds per state, counted from the start of its
+    first task, so it bounds the state however many tasks it is split into.
+    A state past its deadline is abandoned, and workers stuck on abandoned
+    tasks are replaced once no healthy worker is left. A task whose worker
+    dies is recorded as an error: the pool replaces the worker, but the task
+    never reports back, so workers are checked every POLL_SECONDS. With
+    resume, states already recorded as ok or empty in the checkpoint are not
+    fitted again. backend and n_components select the regressor in exact
+    kernel mode (see wnv_models.make_regressor).
+    """
+    check_kernel_mode(kernel_mode, backend)
+    n_workers = n_workers or os.cpu_count()
+    done = read_checkpoint(checkpoint_path) if resume else {}
+    records = {state: record for state, record in done.items() if record["status"] in FINAL_STATUSES}
+    if checkpoint_path and not resume:
+        open(checkpoint_path, "w").close()
+
+    tasks = []
+    chunks_left = {}
+    replicate_results = {}
+    for state, X, years, y in blocks:
+        if state in records:
+            continue
+        chunks = [range(start, min(start + chunk_size, n_replicates)) for start in range(0, n_replicates, chunk_size)]
+        chunks_left[state] = len(chunks)
+        replicate_results[state] = []
+        tasks.extend(((state, X, years, y, chunk), len(y) ** 2 * len(chunk)) for chunk in chunks)
+    tasks.sort(key=lambda task: task[1], reverse=True)
+    todo = iter(task for task, _ in tasks)
+
+    finished = queue.Queue()
+    # A SimpleQueue writes as the task starts, so the report is not lost when the worker is killed later
+    started = multiprocessing.SimpleQueue()
+    running = {}  # (state, first replicate) -> deadline
+    deadlines = {}  # state -> deadline, set when its first task starts
+    abandoned = set()  # timed-out tasks whose worker is still busy
+    pids = {}  # task id -> pid of the worker running it
+
+    def record(state, status, result=None):
+        records[state] = {"state": state, "status": status, **(result or {})}
+        if checkpoint_path:
+            with open(checkpoint_path, "a") as f:
+                f.write(json.dumps(records[state]) + "\n")
+        print(f"State: {state}, {status}" + "".join(f", {k}: {v}" for k, v in (result or {}).items()))
+
+    def submit(pool, task):
+        state, X, years, y, chunk = task
+        task_id = (state, chunk.start)
+        pool.apply_async(
+            _run_task, (task_id, X, years, y, model_params, chunk, seed, kernel_mode, 2018, backend, n_components),
+            callback=lambda results: finished.put((task_id, "ok", results)),
+            error_callback=lambda error: finished.put((task_id, "error", {"error": repr(error)})),
+        )
+        running[task_id] = deadlines.setdefault(state, time.monotonic() + timeout if timeout else float("inf"))
+
+    def new_pool():
+        return multiprocessing.Pool(n_workers, initializer=_init_worker, initargs=(started,))
+
+    pool = new_pool()
+    try:
+        remaining = True
+        while True:
+            # Keep one task per healthy worker, so a task's deadline starts when it does
+            while remaining and len(running) + len(abandoned) < n_workers:
+                task = next(todo, None)
+                if task is None:
+                    remaining = False
+                elif task[0] not in records:
+                    submit(pool, task)
+            if not running:
+                if not remaining:
+                    break
+                # Every worker is stuck on a timed-out task: replace the pool
+                pool.terminate()
+                pool = new_pool()
+                abandoned.clear()
+                continue
+
+            next_deadline = min(running.values())
+            wait = min(POLL_SECONDS, max(0, next_deadline - time.monotonic()))
+            try:
+                task_id, status, results = finished.get(timeout=wait)
+            except queue.Empty:
+                now = time.monotonic()
+                for task_id in [t for t, deadline in running.items() if deadline <= now]:
+                    del running[task_id]
+                    abandoned.add(task_id)
+                    if task_id[0] not in records:
+                        record(task_id[0], "timeout")
+
+                # The pool replaces a worker that died mid-task, but that task never reports back
+                while not started.empty():
+                    task_id, pid = started.get()
+                    pids[task_id] = pid
+                alive = {child.pid for child in multiprocessing.active_children()}
+                dead = {task_id for task_id, pid in pids.items() if pid not in alive}
+                abandoned -= dead
+                for task_id in [t for t in running if t in dead]:
+                    del running[task_id]
+                    if task_id[0] not in records:
+                        record(task_id[0], "error", {"error": f"worker {pids[task_id]} died"})
+                continue
+
+            if task_id in abandoned:
+                abandoned.discard(task_id)
+                continue
+            if task_id not in running:
+                continue
+            del running[task_id]
+            state = task_id[0]
+            if state in records:
+                continue
+            if status == "error":
+                record(state, "error", results)
+                continue
+
+            replicate_results[state].extend(result for result in results if result is not None)
+            chunks_left[state] -= 1
+            if chunks_left[state] == 0:
+                if replicate_results[state]:
+                    record(state, "ok", summarize(replicate_results.pop(state)))
+                else:
+                    record(state, "empty")
+    finally:
+        pool.terminate()
+
+    return records
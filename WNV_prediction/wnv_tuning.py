@@ -0,0 +1,149 @@
+"""
+Rolling-origin hyperparameter search for the WNV SVR models.
+
+Every tuning year is one fold: the candidates are trained on the years
+before it, scaled on those years only, and scored on the tuning year itself.
+Each fold's scaled matrix is built once and cached as .npy files keyed by a
+fingerprint of the inputs, so re-tuning on unchanged data (e.g. with more
+candidates) skips the scaling and the cached arrays are memory-mapped by the
+search workers instead of copied.
+
+The search over C, epsilon, gamma (scale, auto or a number) and kernel is a
+successive-halving random search: all candidates start on a small subsample
+of the fold, and only the best 1/factor of them go on to the next round with
+factor times more rows, so poor configs are pruned after cheap fits. The
+candidates of each round are fitted in a process pool.
+"""
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+from scipy.stats import loguniform
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import HalvingRandomSearchCV, PredefinedSplit
+from sklearn.svm import SVR
+
+from wnv_design import weighted_mean_std
+
+KERNELS = ("rbf", "poly", "sigmoid", "linear")
+
+# Columns of hyperparameter_tuning_best.csv, as read by the bootstrap and SHAP scripts
+HYPERPARAMETER_COLUMNS = ["tuning_year", "C", "epsilon", "gamma", "kernel"]
+
+
+def search_space(kernels=KERNELS):
+    """
+    Candidate distributions: gamma is "scale"/"auto" for half of the candidates and log-uniform for the rest.
+    """
+    common = {"C": loguniform(1e-2, 1e3), "epsilon": loguniform(1e-3, 1.0), "kernel": list(kernels)}
+    return [{**common, "gamma": ["scale", "auto"]}, {**common, "gamma": loguniform(1e-4, 1.0)}]
+
+
+def fingerprint(X, y, years):
+    """
+    Short hash of the tuning inputs, naming their cached folds.
+    """
+    digest = hashlib.sha1()
+    for array in (X, y, years):
+        array = np.ascontiguousarray(array)
+        digest.update(str((array.dtype, array.shape)).encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def scaled_fold(X, y, years, tuning_year, cache_dir=None, key=None):
+    """
+    Rows of the years up to tuning_year, standardized on the years before it.
+
+    Returns (X_fold, y_fold, test_fold), where test_fold is the
+    PredefinedSplit array: -1 for the training years, 0 for tuning_year.
+    With cache_dir, the arrays are written there on the first call and
+    memory-mapped from there on later calls with the same inputs.
+    """
+    if cache_dir is not None:
+        stem = os.path.join(cache_dir, f"fold_{key or fingerprint(X, y, years)}_{tuning_year}")
+        paths = [f"{stem}_{name}.npy" for name in ("X", "y", "test_fold")]
+        if all(os.path.exists(path) for path in paths):
+            return tuple(np.load(path, mmap_mode="r") for path in paths)
+
+    rows = years <= tuning_year
+    train = years[rows] < tuning_year
+    if not train.any() or train.all():
+        raise ValueError(f"Tuning year {tuning_year} needs both earlier years and rows of its own")
+    X_fold = X[rows]
+    mean, std = weighted_mean_std(X_fold[train], np.ones(train.sum()))
+    X_fold = (X_fold - mean) / std
+    arrays = (np.ascontiguousarray(X_fold), y[rows], np.where(train, -1, 0))
+
+    if cache_dir is None:
+        return arrays
+    os.makedirs(cache_dir, exist_ok=True)
+    for path, array in zip(paths, arrays):
+        # Write under a temporary name first, so an interrupted run never leaves a partial fold behind
+        tmp_path = f"{path[:-4]}.tmp.npy"
+        np.save(tmp_path, array)
+        os.replace(tmp_path, path)
+    return tuple(np.load(path, mmap_mode="r") for path in paths)
+
+
+def tune_year(X, y, years, tuning_year, n_candidates=200, factor=3, scoring="r2", n_workers=None, seed=0,
+              cache_dir=None, key=None):
+    """
+    Successive-halving search for one tuning year.
+
+    Returns (best_params, results), with results holding one row per fitted
+    candidate and round (its params, the rows it was fitted on and its score).
+    """
+    X_fold, y_fold, test_fold = scaled_fold(X, y, years, tuning_year, cache_dir, key)
+    search = HalvingRandomSearchCV(
+        SVR(cache_size=500),
+        search_space(),
+        n_candidates=n_candidates,
+        factor=factor,
+        resource="n_samples",
+        min_resources="exhaust",  # The last round uses every row of the fold
+        cv=PredefinedSplit(test_fold),
+        scoring=scoring,
+        refit=False,
+        random_state=seed,
+        n_jobs=n_workers,
+    )
+    search.fit(X_fold, y_fold)
+    best_params = {name: value.item() if isinstance(value, np.generic) else value
+                   for name, value in search.best_params_.items()}
+    print(f"Tuning Year: {tuning_year}, best: {best_params}, {scoring}: {search.best_score_:.3f}")
+
+    cv_results = search.cv_results_
+    results = pd.DataFrame({
+        "tuning_year": tuning_year,
+        "round": cv_results["iter"],
+        "n_rows": cv_results["n_resources"],
+        "C": cv_results["param_C"],
+        "epsilon": cv_results["param_epsilon"],
+        "gamma": cv_results["param_gamma"],
+        "kernel": cv_results["param_kernel"],
+        "score": cv_results["mean_test_score"],
+        "fit_seconds": cv_results["mean_fit_time"],
+    })
+    return best_params, results
+
+
+def tune(X, y, years, tuning_years, n_candidates=200, factor=3, scoring="r2", n_workers=None, seed=0,
+         cache_dir=None):
+    """
+    Tune every year in tuning_years on its rolling-origin fold.
+
+    Returns (best, results): best has one row per tuning year in the
+    HYPERPARAMETER_COLUMNS schema, results concatenates the per-year search
+    results of tune_year.
+    """
+    key = fingerprint(X, y, years) if cache_dir is not None else None
+    best_rows, results = [], []
+    for tuning_year in tuning_years:
+        best_params, year_results = tune_year(
+            X, y, years, tuning_year, n_candidates, factor, scoring, n_workers, seed, cache_dir, key
+        )
+        best_rows.append({"tuning_year": tuning_year, **best_params})
+        results.append(year_results)
+    return pd.DataFrame(best_rows, columns=HYPERPARAMETER_COLUMNS), pd.concat(results, ignore_index=True)